@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class RateLimiter:
+    """每個 key 一個 token bucket：每秒補充 rate 個 token，最多累積 burst 個
+
+    只保留最近使用的 max_keys 個 bucket，長時間沒有請求的 key 會被移除
+    (重新建立時是滿的，與閒置夠久的效果相同)。
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> [tokens, 上次更新時間]
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key, now=None):
+        """取得一個 token，成功回傳 0，否則回傳需要等待的秒數"""
+        if not self.rate:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    def refund(self, key):
+        """退回 acquire() 取得的 token"""
+        if not self.rate:
+            return
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+
+
+class AdmissionControl:
+    """寫入類請求的准入控制，超過限制時回傳 429 與 Retry-After
+
+    - 每個 IP 與每個發送者各自的 token bucket，註冊發送者另有較嚴格的限制
+    - 同時處理中的 /transaction 請求數上限，超過時直接拒絕而不排隊
+    - 交易池上限，挖礦跟不上時不再接受新交易
+    - /add_peer 與 /transaction 共用每個 IP 的額度
+    只有設定檔中的節點(static_peers)轉發時不受 IP、處理名額與交易池的限制，
+    任何人都能呼叫 /add_peer，動態加入的節點不能因此繞過限制；
+    發送者的額度則不論來源都要扣，避免透過多個節點轉發灌爆同一個發送者。
+    rate 設為 0 表示不限制。
+    """
+
+    def __init__(self, blockchain, ip_rate=20.0, ip_burst=40, sender_rate=5.0, sender_burst=20,
+                 register_rate=1.0, register_burst=20, max_inflight=32, max_mempool=5000):
+        self.blockchain = blockchain
+        self.ip = RateLimiter(ip_rate, ip_burst)
+        self.sender = RateLimiter(sender_rate, sender_burst)
+        self.register = RateLimiter(register_rate, register_burst)
+        self.max_inflight = max_inflight
+        self.max_mempool = max_mempool
+        self.inflight = 0
+        self.lock = threading.Lock()
+        blockchain.admission = self
+
+    def limits(self, remote_addr):
+        """設定檔指定的節點轉發的請求不受限制"""
+        network = self.blockchain.network
+        return remote_addr is not None and not (
+            network is not None and any(urlparse(peer).hostname == remote_addr for peer in network.static_peers))
+
+    def reject(self, reason, message, retry_after):
+        self.blockchain.metrics.rejected.inc(label_value=reason)
+        return {
+            "success": False,
+            "message": message,
+            "retry_after": round(retry_after, 3)
+        }
+
+    def admit_request(self, path, remote_addr):
+        """在解析請求內容前檢查，回傳 (拒絕的回應或 None, 是否佔用處理名額)
+
+        佔用名額時，請求處理完後需呼叫 release()。
+        """
+        if path not in ('/transaction', '/register_sender', '/add_peer') or not self.limits(remote_addr):
+            return None, False
+        if path == '/register_sender':
+            wait = self.register.acquire(remote_addr)
+            if wait:
+                return self.reject('register', "Too many sender registrations", wait), False
+            return None, False
+
+        wait = self.ip.acquire(remote_addr)
+        if wait:
+            return self.reject('ip', "Rate limit exceeded for this address", wait), False
+        if path == '/add_peer':
+            return None, False
+        with self.lock:
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                full = True
+            else:
+                full = False
+                self.inflight += 1
+        if full:
+            return self.reject('overload', "Node is busy, try again later", 1.0), False
+        return None, True
+
+    def release(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def admit_transaction(self, sender, remote_addr=None):
+        """解析出發送者後檢查交易池容量與發送者的額度；設定的節點轉發時只檢查發送者
+
+        交易最後沒有被接受(簽章錯誤、重複)時應呼叫 refund_sender()，
+        否則偽造某個 sender id 的請求就能耗盡該發送者的額度。
+        """
+        if self.max_mempool and len(self.blockchain.mempool) >= self.max_mempool and self.limits(remote_addr):
+            # 大約等一個區塊的時間再試
+            return self.reject('mempool', "Mempool is full", self.blockchain.block_time)
+        wait = self.sender.acquire(sender)
+        if wait:
+            return self.reject('sender', "Rate limit exceeded for this sender", wait)
+        return None
+
+    def refund_sender(self, sender):
+        self.sender.refund(sender)
@@ -0,0 +1,284 @@
+import argparse
+import math
+import threading
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from admission import AdmissionControl
+from config import NodeConfig, add_arguments
+from exporter import ColumnarExporter
+from mempool_log import MempoolLog
+from miner import ProcessMiner
+from p2p import PeerNetwork
+from pruning import ChainPruner
+from query import ReadingStore
+from server import BlockChain
+from snapshot import load_snapshot, snapshot_bytes
+from wire import MAX_BODY_SIZE, decode_body, encode_response
+
+
+class RouteTimingMiddleware:
+    """記錄每個路由的請求延遲，未知路徑歸為 other 以限制標籤數量"""
+
+    def __init__(self, app, metrics, paths):
+        self.app = app
+        self.metrics = metrics
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope['path'] if scope['path'] in self.paths else 'other'
+            self.metrics.request_seconds.observe(time.perf_counter() - start, route)
+
+
+class AdmissionMiddleware:
+    """在讀取請求內容前套用 AdmissionControl 的 IP 限制與同時處理數上限"""
+
+    def __init__(self, app, block):
+        self.app = app
+        self.block = block
+
+    async def __call__(self, scope, receive, send):
+        admission = self.block.admission
+        if scope['type'] != 'http' or admission is None:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get('client')
+        rejection, slot = admission.admit_request(scope['path'], client[0] if client else None)
+        if rejection is not None:
+            await respond(Request(scope), rejection)(scope, receive, send)
+            return
+        if not slot:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+
+async def read_request(request):
+    """邊讀邊檢查大小，超過 MAX_BODY_SIZE 的請求不會整個讀進記憶體"""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BODY_SIZE:
+            raise ValueError(f"Request body exceeds {MAX_BODY_SIZE} bytes")
+    return decode_body(bytes(body), request.headers.get('content-type'),
+                       request.headers.get('content-encoding'))
+
+
+def respond(request, data):
+    """依 Accept / Accept-Encoding 選擇回應格式與壓縮方式，被限流的請求回傳 429"""
+    body, content_type, encoding = encode_response(
+        data, request.headers.get('accept'), request.headers.get('accept-encoding'))
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    status = 200
+    if 'retry_after' in data:
+        status = 429
+        headers['Retry-After'] = str(math.ceil(data['retry_after']))
+    return Response(body, status_code=status, media_type=content_type, headers=headers)
+
+
+def create_app(block):
+    """建立 ASGI app，路由與 server.py 的 Flask 版本相同"""
+
+    async def hello_world(request):
+        return PlainTextResponse('Hello World')
+
+    async def transaction(request):
+        trace = block.tracer.start('transaction')
+        try:
+            req = await read_request(request)
+        except Exception as e:
+            return respond(request, {
+                "success": False,
+                "message": f"Error processing transaction: {str(e)}"
+            })
+        trace.mark('parse_json')
+        # 簽章驗證會佔用 CPU，丟到執行緒池避免卡住 event loop
+        res = await run_in_threadpool(block.request_transaction, req, trace,
+                                      request.client.host if request.client else None)
+        return respond(request, res)
+
+    async def get_chain(request):
+        start = time.perf_counter()
+        trace = block.tracer.start('get_chain')
+
+        def build():
+            res = block.request_chain()
+            trace.mark('request_chain')
+            res = respond(request, res)
+            trace.mark('serialize')
+            return res
+        res = await run_in_threadpool(build)
+        block.tracer.finish(trace)
+        block.metrics.observe_chain_response(len(res.body), time.perf_counter() - start)
+        return res
+
+    async def block_stats(request):
+        return JSONResponse(block.block_stats.to_dict())
+
+    async def metrics(request):
+        return PlainTextResponse(block.metrics.render(), media_type='text/plain; version=0.0.4')
+
+    async def traces(request):
+        return JSONResponse(block.request_traces(request.query_params.get('recent', 20)))
+
+    async def tracing(request):
+        try:
+            data = await read_request(request)
+        except Exception as e:
+            return respond(request, {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return JSONResponse(block.request_tracing(data))
+
+    async def profile(request):
+        if request.method == 'POST':
+            try:
+                data = await read_request(request)
+            except Exception as e:
+                return respond(request, {
+                    "success": False,
+                    "message": f"Error: {str(e)}"
+                })
+            return JSONResponse(block.request_profile(data))
+        return PlainTextResponse(block.profiler.folded())
+
+    async def query(request):
+        try:
+            data = await read_request(request)
+        except Exception as e:
+            return respond(request, {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return respond(request, await run_in_threadpool(block.request_query, data))
+
+    async def get_block(request):
+        return JSONResponse(block.network.request_block(request.query_params.get('hash')))
+
+    async def get_headers(request):
+        start = int(request.query_params.get('start', 0))
+        count = int(request.query_params.get('count', 0))
+        return respond(request, await run_in_threadpool(block.network.request_headers, start, count))
+
+    async def get_blocks(request):
+        data = await read_request(request)
+        return respond(request, await run_in_threadpool(block.network.request_blocks, data))
+
+    async def sync_status(request):
+        return JSONResponse(block.network.synchronizer.status())
+
+    async def announce_block(request):
+        data = await request.json()
+        res = await run_in_threadpool(block.network.request_announce_block, data, request.client.host)
+        return JSONResponse(res)
+
+    async def add_peer(request):
+        data = await request.json()
+        return JSONResponse(block.network.request_add_peer(data, request.client.host))
+
+    async def snapshot(request):
+        res = await run_in_threadpool(snapshot_bytes, block)
+        return Response(res, media_type='application/gzip')
+
+    async def senders(request):
+        return respond(request, block.request_senders())
+
+    async def register_sender(request):
+        try:
+            data = await read_request(request)
+        except Exception as e:
+            return respond(request, {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return respond(request, block.request_register_sender(data))
+
+    routes = [
+        Route('/', hello_world),
+        Route('/transaction', transaction, methods=['POST']),
+        Route('/get_chain', get_chain, methods=['GET']),
+        Route('/block_stats', block_stats, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/traces', traces, methods=['GET']),
+        Route('/tracing', tracing, methods=['POST']),
+        Route('/profile', profile, methods=['GET', 'POST']),
+        Route('/query', query, methods=['POST']),
+        Route('/get_block', get_block, methods=['GET']),
+        Route('/get_headers', get_headers, methods=['GET']),
+        Route('/get_blocks', get_blocks, methods=['POST']),
+        Route('/sync_status', sync_status, methods=['GET']),
+        Route('/announce_block', announce_block, methods=['POST']),
+        Route('/add_peer', add_peer, methods=['POST']),
+        Route('/snapshot', snapshot, methods=['GET']),
+        Route('/senders', senders, methods=['GET']),
+        Route('/register_sender', register_sender, methods=['POST']),
+    ]
+    middleware = [
+        Middleware(RouteTimingMiddleware, metrics=block.metrics, paths=[route.path for route in routes]),
+        Middleware(AdmissionMiddleware, block=block),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ]
+    return Starlette(routes=routes, middleware=middleware)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the blockchain node behind an ASGI server")
+    add_arguments(parser)
+    config = NodeConfig.from_args(parser.parse_args())
+
+    import uvicorn
+
+    port = config['port']
+    block = BlockChain()
+    block.miner_key_path = f"miner-{port}.pem" if config['miner_key'] is None else config['miner_key']
+    network = PeerNetwork(block, port, config['peers'])
+    if config['prune_horizon']:
+        ChainPruner(block, config['prune_horizon'], archive_dir=config['archive_dir'])
+    ReadingStore(block, config['query_db']).start()
+    AdmissionControl(block)
+    # 在建立創世區塊之前套用，初始難度才會生效
+    config.apply(block)
+    config.watch(block)
+    if config['export_dir']:
+        ColumnarExporter(config['export_dir']).start(block)
+    if config['snapshot']:
+        load_snapshot(block, config['snapshot'], config['checkpoint'])
+    if config['peers']:
+        network.connect()
+    elif not block.chain:
+        block.create_genesis_block()
+    # 鏈載入後再重播，已上鏈的交易不會放回交易池
+    wal = f"mempool-{port}.wal" if config['wal'] is None else config['wal']
+    if wal:
+        MempoolLog(block, wal).replay()
+
+    if config['miners']:
+        ProcessMiner(block, config['miners']).start()
+    else:
+        threading.Thread(target=block.mining, daemon=True).start()
+
+    uvicorn.run(create_app(block), host=config['host'], port=port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import json
+import time
+from collections import deque
+
+
+def transaction_size(transaction):
+    """交易序列化後的 byte 數，作為區塊容量的計算單位；交易加入交易池時計算一次並快取"""
+    if transaction.size is None:
+        transaction.size = len(json.dumps(transaction.to_dict()).encode('utf-8'))
+    return transaction.size
+
+
+class BlockSizePolicy:
+    """依照待處理交易的積壓量決定區塊的 byte 預算"""
+
+    def __init__(self, base_bytes=4096, max_bytes=262144, drain_blocks=4):
+        self.base_bytes = base_bytes
+        self.max_bytes = max_bytes
+        # 積壓時希望在幾個區塊內清空
+        self.drain_blocks = drain_blocks
+
+    def budget(self, backlog_bytes):
+        return min(self.max_bytes, max(self.base_bytes, backlog_bytes // self.drain_blocks))
+
+    def select(self, pending_transactions, backlog_bytes):
+        """依序挑選放得進預算的交易，回傳 (選中的交易, 使用的 bytes, 預算, 剩餘積壓 bytes)
+
+        backlog_bytes 為交易池維護的總 bytes，只需走訪放得進區塊的交易。
+        """
+        budget = self.budget(backlog_bytes)
+
+        used = 0
+        count = 0
+        for transaction in pending_transactions:
+            size = transaction_size(transaction)
+            # 單筆超過預算時仍放入空區塊，避免卡住
+            if used + size > budget and count:
+                break
+            used += size
+            count += 1
+        return pending_transactions[:count], used, budget, backlog_bytes - used
+
+
+class BlockStats:
+    """記錄區塊填充率、積壓深度與預估清空時間"""
+
+    def __init__(self, window=20):
+        self.history = deque(maxlen=window)
+        self.backlog_count = 0
+        self.backlog_bytes = 0
+
+    def record(self, used_bytes, budget, transactions, backlog_count, backlog_bytes):
+        self.history.append({
+            'timestamp': time.time(),
+            'used_bytes': used_bytes,
+            'budget': budget,
+            'transactions': transactions
+        })
+        self.backlog_count = backlog_count
+        self.backlog_bytes = backlog_bytes
+
+    def fill_rate(self):
+        if not self.history:
+            return 0
+        return sum(h['used_bytes'] / h['budget'] for h in self.history) / len(self.history)
+
+    def drain_time(self):
+        """以最近區塊的出塊速率估計清空積壓所需秒數"""
+        if not self.backlog_bytes:
+            return 0
+        if len(self.history) < 2:
+            return None
+        elapsed = self.history[-1]['timestamp'] - self.history[0]['timestamp']
+        mined_bytes = sum(h['used_bytes'] for h in list(self.history)[1:])
+        if elapsed <= 0 or not mined_bytes:
+            return None
+        return self.backlog_bytes / (mined_bytes / elapsed)
+
+    def to_dict(self):
+        drain_time = self.drain_time()
+        return {
+            'fill_rate': round(self.fill_rate(), 4),
+            'backlog_transactions': self.backlog_count,
+            'backlog_bytes': self.backlog_bytes,
+            'drain_time': round(drain_time, 2) if drain_time is not None else None,
+            'last_block': self.history[-1] if self.history else None
+        }
@@ -0,0 +1,77 @@
+from difficulty import MAX_TARGET
+
+
+def block_work(target):
+    """找到一個符合門檻的雜湊平均需要嘗試的次數"""
+    return (MAX_TARGET + 1) // (target + 1)
+
+
+class BranchView:
+    """主鏈前 length 個區塊接上分岔區塊的唯讀視圖"""
+
+    def __init__(self, chain, length, branch):
+        self.chain = chain
+        self.length = length
+        self.branch = branch
+        self.transaction_keys = set(tx.key() for block in branch for tx in block.transactions)
+
+    def __len__(self):
+        return self.length + len(self.branch)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('chain index out of range')
+        if index < self.length:
+            return self.chain[index]
+        return self.branch[index - self.length]
+
+
+class BlockTree:
+    """保存所有驗證過的區塊(包含分岔)，並記錄每個區塊的累積工作量"""
+
+    def __init__(self):
+        self.blocks = {}
+        self.heights = {}
+        self.work = {}
+
+    def __contains__(self, block_hash):
+        return block_hash in self.blocks
+
+    def add(self, block):
+        parent = block.previous_hash
+        if parent in self.blocks:
+            self.heights[block.hash] = self.heights[parent] + 1
+            self.work[block.hash] = self.work[parent] + block_work(block.target)
+        else:
+            # 創世區塊
+            self.heights[block.hash] = 0
+            self.work[block.hash] = block_work(block.target)
+        self.blocks[block.hash] = block
+
+    def branch(self, block_hash, block_index, chain):
+        """從 block_hash 往回走到主鏈上，回傳 (分岔點高度, 分岔上的區塊，由舊到新)"""
+        branch = []
+        while True:
+            height = block_index.get(block_hash)
+            if height is not None and height < len(chain) and chain[height].hash == block_hash:
+                break
+            block = self.blocks[block_hash]
+            branch.append(block)
+            block_hash = block.previous_hash
+        branch.reverse()
+        return height, branch
+
+    def prune_side_branches(self, height, block_index):
+        """移除高度低於 height、且不在主鏈上的區塊，以及接在它們之後的分岔"""
+        side = sorted((block_height, block_hash) for block_hash, block_height in self.heights.items()
+                      if block_hash not in block_index)
+        removed = set()
+        for block_height, block_hash in side:
+            if block_height < height or self.blocks[block_hash].previous_hash in removed:
+                removed.add(block_hash)
+        for block_hash in removed:
+            del self.blocks[block_hash]
+            del self.heights[block_hash]
+            del self.work[block_hash]
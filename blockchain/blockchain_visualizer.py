@@ -1,15 +1,14 @@
 import streamlit as st
-import networkx as nx
-from pyvis.network import Network
 import tempfile
 import os
 import requests
 import json
 from datetime import datetime
-import plotly.express as px
-import pandas as pd
 from ast import literal_eval
 
+import wire
+from exporter import decode_batch
+
 # 設置頁面配置，增加側邊欄寬度
 st.set_page_config(
     page_title="Blockchain Visualization",
@@ -30,8 +29,8 @@ st.markdown("""
 def fetch_blockchain_data(server_url="http://localhost:8000"):
     """從區塊鏈服務器獲取數據"""
     try:
-        response = requests.get(f"{server_url}/get_chain")
-        data = response.json()
+        response = requests.get(f"{server_url}/get_chain", headers=wire.client_headers(), stream=True)
+        data = wire.decode_response(response)
         return data["chain"]
     except Exception as e:
         st.error(f"Error fetching blockchain data: {str(e)}")
@@ -65,6 +64,9 @@ def format_blockchain_data(chain_data):
 
 def create_blockchain_graph(data):
     """創建區塊鏈圖"""
+    # networkx、pyvis、plotly、pandas 只在用到的頁面才載入，縮短每次重新執行的時間
+    import networkx as nx
+
     G = nx.DiGraph()
     
     for block in data:
@@ -120,6 +122,8 @@ def create_blockchain_graph(data):
 
 def plot_interactive_blockchain(G):
     """使用PyVis繪製互動圖"""
+    from pyvis.network import Network
+
     net = Network(height="600px", width="100%", directed=True, bgcolor="#222222")
     
     # 配置視覺化參數
@@ -376,6 +380,9 @@ def main():
 # 換原來的 display_transaction_analytics 函數
 def display_transaction_statistics(formatted_data):
     """顯示交易相關的統計圖表"""
+    import pandas as pd
+    import plotly.express as px
+
     # 準備交易數據
     transactions = []
     for block in formatted_data:
@@ -387,6 +394,17 @@ def display_transaction_statistics(formatted_data):
                 # 直接使用 ast.literal_eval 來安全��解析 Python 字典字串
                 message_dict = literal_eval(tx['message'])
                 
+                # 邊緣端彙整的批次交易，展開成多筆讀值
+                if message_dict.get('codec') == 'delta-zlib' and 'data' in message_dict:
+                    for reading in decode_batch(message_dict):
+                        transactions.append({
+                            'timestamp': datetime.fromtimestamp(reading['timestamp']),
+                            'temperature': reading.get('temperature'),
+                            'humidity': reading.get('humidity'),
+                            'PM2.5': reading.get('PM2.5')
+                        })
+                    continue
+
                 # 只處理含環境感測數據的消息
                 if any(key in message_dict for key in ['temperature', 'humidity', 'PM2.5']):
                     tx_data = {
@@ -438,6 +456,9 @@ def display_transaction_statistics(formatted_data):
 
 def display_pig_weight_tracking(formatted_data):
     """顯示豬隻體重追蹤圖表"""
+    import pandas as pd
+    import plotly.express as px
+
     # 準備體重數據
     weight_data = []
     for block in formatted_data:
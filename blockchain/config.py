@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+from difficulty import RetargetPolicy, target_from_difficulty
+
+ENV_PREFIX = 'NODE_'
+# 名稱 -> (預設值, 說明)；命令列參數為 --名稱(底線換成 -)，環境變數為 NODE_名稱大寫
+SETTINGS = {
+    'host': ('0.0.0.0', "address to listen on"),
+    'port': (8000, "port to listen on"),
+    'peers': ([], "peer node URLs; when given, sync from them instead of creating a genesis block"),
+    'snapshot': (None, "bootstrap from a snapshot file exported by /snapshot or snapshot.py"),
+    'checkpoint': (None, "trusted <height>:<tip hash> (or tip hash) the snapshot must end with"),
+    'miners': (0, "number of mining processes (0: mine in a thread of this process)"),
+    'prune_horizon': (0, "keep transactions of only the latest N blocks in memory (0: no pruning)"),
+    'archive_dir': (None, "directory for archiving pruned transactions"),
+    'query_db': (':memory:', "SQLite file for the /query reading index (in memory: rebuilt on start)"),
+    'wal': (None, "write-ahead log of accepted transactions (unset: mempool-<port>.wal, '' to disable)"),
+    'miner_key': (None, "PEM file keeping the miner's RSA key across restarts "
+                        "(unset: miner-<port>.pem, '' for a new key each start)"),
+    'export_dir': (None, "export confirmed sensor data to partitioned columnar files in this directory"),
+    'difficulty': (1, "difficulty of the genesis block"),
+    # 難度策略：每個節點必須相同，驗證整條鏈時也以此為準
+    'block_time': (3.0, "target seconds between blocks"),
+    'adjust_difficulty_blocks': (10, "blocks between difficulty retargets"),
+    'difficulty_window': (0, "blocks averaged when retargeting (0: same as adjust_difficulty_blocks)"),
+    'max_adjust': (2.0, "largest factor the target may change by in one retarget"),
+    # 以下可在執行中重新載入
+    'miner_rewards': (10, "reward recorded in each mined block"),
+    'min_transaction_version': (2, "oldest transaction format accepted from clients "
+                                   "(1 lets old clients submit, but their timestamps are not signed)"),
+    'block_base_bytes': (4096, "block size budget without backlog"),
+    'block_max_bytes': (262144, "largest block size budget"),
+    'block_drain_blocks': (4, "blocks over which a backlog should be drained"),
+    'ip_rate': (20.0, "transactions per second allowed from one address (0: unlimited)"),
+    'ip_burst': (40.0, "transactions one address may send at once"),
+    'sender_rate': (5.0, "accepted transactions per second allowed for one sender (0: unlimited)"),
+    'sender_burst': (20.0, "transactions one sender may send at once"),
+    'register_rate': (1.0, "sender registrations per second allowed from one address (0: unlimited)"),
+    'register_burst': (20.0, "sender registrations one address may send at once"),
+    'max_inflight': (32, "transaction requests processed at once before answering 429 (0: unlimited)"),
+    'max_mempool': (5000, "pending transactions before new ones are refused (0: unlimited)"),
+}
+HOT_RELOAD = {'miner_rewards', 'min_transaction_version',
+              'block_base_bytes', 'block_max_bytes', 'block_drain_blocks',
+              'ip_rate', 'ip_burst', 'sender_rate', 'sender_burst', 'register_rate', 'register_burst',
+              'max_inflight', 'max_mempool'}
+# 難度策略屬於共識規則，所有節點必須使用相同的值，否則會拒絕彼此的區塊。
+# 歷史區塊以目前的值驗證，執行中改變會讓從頭同步的節點拒絕舊的調整點，因此不可重新載入
+CONSENSUS = {'block_time', 'adjust_difficulty_blocks', 'difficulty_window', 'max_adjust'}
+POSITIVE = {'block_time', 'adjust_difficulty_blocks', 'max_adjust', 'difficulty', 'min_transaction_version',
+            'block_base_bytes', 'block_max_bytes', 'block_drain_blocks'}
+
+
+def convert(key, value):
+    """把設定檔或環境變數的值轉成預設值的型別"""
+    if key not in SETTINGS:
+        raise ValueError(f"Unknown setting {key}")
+    default = SETTINGS[key][0]
+    if isinstance(default, list):
+        if isinstance(value, str):
+            value = [item for item in value.replace(',', ' ').split() if item]
+        if not isinstance(value, list):
+            raise ValueError(f"{key} must be a list")
+        return [str(item) for item in value]
+    if default is None or isinstance(default, str):
+        return None if value is None else str(value)
+    try:
+        value = type(default)(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a {type(default).__name__}, got {value!r}") from None
+    if value < 0 or (key in POSITIVE and value == 0):
+        raise ValueError(f"{key} must be {'positive' if key in POSITIVE else 'non-negative'}, got {value}")
+    return value
+
+
+def add_arguments(parser):
+    """為每個設定加上命令列參數，沒有指定的參數不會出現在解析結果中"""
+    parser.add_argument("--config", default=os.environ.get(ENV_PREFIX + 'CONFIG'),
+                        help=f"JSON file with any of the settings below; reloadable ones take effect "
+                             f"when it changes (env: {ENV_PREFIX}CONFIG)")
+    for key, (default, text) in SETTINGS.items():
+        flag = '--' + key.replace('_', '-')
+        note = ' [reloadable]' if key in HOT_RELOAD else ' [consensus: same on every node]' if key in CONSENSUS else ''
+        if isinstance(default, list):
+            parser.add_argument(flag, nargs='*', default=argparse.SUPPRESS, help=text + note)
+        else:
+            parser.add_argument(flag, type=str if default is None else type(default), default=argparse.SUPPRESS,
+                                help=f"{text} (default: {default!r}){note}")
+
+
+class NodeConfig:
+    """節點設定：預設值 < 設定檔 < 環境變數 < 命令列參數
+
+    watch() 在設定檔修改後重新載入，HOT_RELOAD 中的設定(區塊容量、速率限制等)
+    立即套用到執行中的節點與挖礦迴圈，其他設定在重啟後才生效；難度策略(CONSENSUS)
+    不會重新載入。
+    命令列參數與環境變數指定的設定不會被設定檔覆蓋。
+    """
+
+    def __init__(self, path=None, overrides=None, environ=None):
+        self.path = path
+        self.overrides = dict(overrides or {})
+        self.environ = os.environ if environ is None else environ
+        self.mtime = self.modified()
+        self.values = self.load()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args, overrides=None):
+        """由 add_arguments() 的解析結果建立，overrides 的優先順序與命令列參數相同"""
+        cli = {key: value for key, value in vars(args).items() if key in SETTINGS}
+        cli.update(overrides or {})
+        return cls(args.config, cli)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def modified(self):
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
+    def load(self):
+        values = {key: list(default) if isinstance(default, list) else default
+                  for key, (default, _) in SETTINGS.items()}
+        if self.path:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"{self.path} must contain a JSON object")
+            for key, value in data.items():
+                values[key] = convert(key, value)
+        for key in SETTINGS:
+            value = self.environ.get(ENV_PREFIX + key.upper())
+            if value is not None:
+                values[key] = convert(key, value)
+        for key, value in self.overrides.items():
+            values[key] = convert(key, value)
+        return values
+
+    def apply(self, blockchain):
+        """把設定套用到節點；只改屬性，挖礦迴圈在下一個區塊模板就會用到新值"""
+        values = self.values
+        if not blockchain.chain:
+            blockchain.difficulty = values['difficulty']
+            blockchain.target = target_from_difficulty(values['difficulty'])
+        blockchain.block_time = values['block_time']
+        blockchain.adjust_difficulty_blocks = values['adjust_difficulty_blocks']
+        blockchain.miner_rewards = values['miner_rewards']
+        blockchain.min_transaction_version = values['min_transaction_version']
+
+        policy = blockchain.difficulty_policy
+        policy.epoch_blocks = values['adjust_difficulty_blocks']
+        if isinstance(policy, RetargetPolicy):
+            policy.block_time = values['block_time']
+            policy.window = values['difficulty_window'] or values['adjust_difficulty_blocks']
+            policy.max_adjust = values['max_adjust']
+
+        size = blockchain.block_size_policy
+        size.base_bytes = values['block_base_bytes']
+        size.max_bytes = max(values['block_max_bytes'], values['block_base_bytes'])
+        size.drain_blocks = values['block_drain_blocks']
+
+        admission = blockchain.admission
+        if admission is not None:
+            for limiter, name in ((admission.ip, 'ip'), (admission.sender, 'sender'),
+                                  (admission.register, 'register')):
+                limiter.rate = values[f'{name}_rate']
+                limiter.burst = max(1.0, values[f'{name}_burst'])
+            admission.max_inflight = values['max_inflight']
+            admission.max_mempool = values['max_mempool']
+
+    def reload(self, blockchain):
+        """重新讀取設定並套用可重新載入的項目，回傳 名稱 -> (舊值, 新值)"""
+        with self.lock:
+            values = self.load()
+            changes = {}
+            for key, value in values.items():
+                if value == self.values[key]:
+                    continue
+                if key in CONSENSUS:
+                    print(f"Config: {key} = {value!r} ignored, difficulty settings are consensus rules "
+                          f"shared by the whole chain and cannot be reloaded")
+                    values[key] = self.values[key]
+                    continue
+                if key not in HOT_RELOAD:
+                    print(f"Config: {key} = {value!r} takes effect after a restart")
+                    values[key] = self.values[key]
+                    continue
+                changes[key] = (self.values[key], value)
+            self.values = values
+            self.apply(blockchain)
+        for key, (old, new) in changes.items():
+            print(f"Config: {key} {old!r} -> {new!r}")
+        return changes
+
+    def watch(self, blockchain, interval=2.0):
+        """背景檢查設定檔的修改時間，變更時重新載入；格式錯誤時保留目前的設定"""
+        if not self.path:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                mtime = self.modified()
+                if mtime is None or mtime == self.mtime:
+                    continue
+                self.mtime = mtime
+                try:
+                    self.reload(blockchain)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring invalid config {self.path}: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,122 @@
+import math
+import time
+
+# SHA-1 雜湊為 160 bits，雜湊值(視為整數)小於等於 target 即為合法區塊
+MAX_TARGET = (1 << 160) - 1
+# 區塊時間不得早於最近 MEDIAN_TIME_SPAN 個區塊時間的中位數，也不得超前本機時鐘 MAX_FUTURE_DRIFT 秒
+MEDIAN_TIME_SPAN = 11
+MAX_FUTURE_DRIFT = 120
+
+
+def target_from_difficulty(difficulty):
+    """將難度(以前導 0 的十六進位位數為單位，可為小數)轉為數值門檻"""
+    target = int(MAX_TARGET / (16 ** difficulty))
+    return min(max(target, 1), MAX_TARGET)
+
+
+def difficulty_from_target(target):
+    """將數值門檻轉回難度，difficulty 1 約等於一個前導 0"""
+    return round(math.log(MAX_TARGET / target, 16), 4)
+
+
+def check_proof_of_work(block_hash, target):
+    """檢查區塊雜湊是否符合門檻"""
+    return int(block_hash, 16) <= target
+
+
+def median_time_past(chain, span=MEDIAN_TIME_SPAN):
+    """最近 span 個區塊時間的中位數"""
+    times = sorted(chain[idx].timestamp for idx in range(max(0, len(chain) - span), len(chain)))
+    return times[len(times) // 2]
+
+
+def check_timestamp(timestamp, chain, now=None):
+    """檢查接在 chain 之後的區塊時間，回傳錯誤訊息，合法時回傳 None
+
+    難度依出塊時間調整，不限制時間的話節點可以填入未來的時間逐步降低難度。
+    時間以秒為單位，出塊很快時同一秒可能有多個區塊，因此允許等於中位數。
+    """
+    if timestamp < median_time_past(chain):
+        return "Block timestamp is earlier than the median of recent blocks"
+    if timestamp > (time.time() if now is None else now) + MAX_FUTURE_DRIFT:
+        return "Block timestamp is too far in the future"
+    return None
+
+
+class DifficultyPolicy:
+    """難度調整策略的介面，依照目前的鏈計算下一個區塊的門檻"""
+
+    def __init__(self, epoch_blocks):
+        self.epoch_blocks = epoch_blocks
+
+    def is_epoch_boundary(self, chain):
+        return len(chain) > self.epoch_blocks and len(chain) % self.epoch_blocks == 1
+
+    def average_block_time(self, chain, window):
+        window = min(window, len(chain) - 1)
+        if window <= 0:
+            return 0
+        return (chain[-1].timestamp - chain[-window - 1].timestamp) / window
+
+    def next_target(self, chain):
+        raise NotImplementedError
+
+
+class StepDifficultyPolicy(DifficultyPolicy):
+    """舊版策略：每個 epoch 難度加一，直到 max_difficulty 為止"""
+
+    def __init__(self, epoch_blocks, max_difficulty=6):
+        super().__init__(epoch_blocks)
+        self.max_difficulty = max_difficulty
+
+    def next_target(self, chain):
+        target = chain[-1].target
+        if not self.is_epoch_boundary(chain):
+            return target
+        difficulty = round(difficulty_from_target(target))
+        return target_from_difficulty(min(difficulty + 1, self.max_difficulty))
+
+
+class RetargetPolicy(DifficultyPolicy):
+    """依照滑動視窗內的實際出塊時間，將門檻調整向 block_time"""
+
+    def __init__(self, block_time, epoch_blocks, window=None, max_adjust=2.0):
+        super().__init__(epoch_blocks)
+        self.block_time = block_time
+        self.window = window or epoch_blocks
+        self.max_adjust = max_adjust
+
+    def next_target(self, chain):
+        target = chain[-1].target
+        if not self.is_epoch_boundary(chain):
+            return target
+
+        window = min(self.window, len(chain) - 1)
+        # 以毫秒計算，避免 block_time 為小數時失去精度
+        expected = int(self.block_time * window * 1000)
+        actual = (chain[-1].timestamp - chain[-window - 1].timestamp) * 1000
+
+        # 限制每個 epoch 的調整幅度
+        actual = max(actual, int(expected / self.max_adjust))
+        actual = min(actual, int(expected * self.max_adjust))
+
+        new_target = target * actual // expected
+        return min(max(new_target, 1), MAX_TARGET)
+
+
+class ChainPrefix:
+    """鏈的前 length 個區塊的唯讀視圖，驗證時不必複製整條鏈"""
+
+    def __init__(self, chain, length):
+        self.chain = chain
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('chain index out of range')
+        return self.chain[index]
@@ -0,0 +1,241 @@
+import argparse
+import base64
+import json
+import math
+import os
+import sys
+import threading
+import time
+import zlib
+from array import array
+from ast import literal_eval
+from importlib.util import find_spec
+
+# pyarrow 載入要數百毫秒，第一次寫檔時才載入；沒有安裝時寫出 numpy 可直接 memmap 的原始欄位檔
+HAS_PYARROW = find_spec('pyarrow') is not None
+
+ENV_FIELDS = {'temperature': 'temperature', 'humidity': 'humidity', 'PM2.5': 'pm25'}
+# 欄位型別：d = float64、q = int64、s = 字串
+SCHEMAS = {
+    'environment': [('timestamp', 'd'), ('height', 'q'), ('sender', 's'),
+                    ('temperature', 'd'), ('humidity', 'd'), ('pm25', 'd')],
+    'weight': [('timestamp', 'd'), ('height', 'q'), ('sender', 's'),
+               ('pig_id', 's'), ('weight', 'd')]
+}
+NUMPY_TYPES = {'d': '<f8', 'q': '<i8'}
+# 讀值時間必須能以 time.gmtime 轉成日期分區(西元 9999 年底以前)
+MAX_TIMESTAMP = 253402300799
+
+
+def decode_batch(message_dict):
+    """還原 pig_farm/aggregator.py 以差分 + zlib 壓縮的讀值序列"""
+    columns = json.loads(zlib.decompress(base64.b64decode(message_dict['data'])))
+    readings = [{} for _ in columns[0]]
+    for field, deltas in zip(['timestamp'] + message_dict['fields'], columns):
+        value = 0
+        for reading, delta in zip(readings, deltas):
+            value += delta
+            reading[field] = value / 100
+    return readings
+
+
+def to_float(value):
+    """轉成有限的浮點數，無法轉換、過大或非有限的值為 NaN"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return math.nan
+    return value if math.isfinite(value) else math.nan
+
+
+def sensor_rows(transaction, height):
+    """把一筆交易的訊息轉成 (感測器類型, 資料列)，無法辨識的訊息略過"""
+    try:
+        message = literal_eval(transaction['message'])
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        # 訊息由客戶端任意填寫，過深或過大的字面值同樣略過
+        return
+    if not isinstance(message, dict):
+        return
+    sender = transaction['sender']
+
+    if message.get('codec') == 'delta-zlib' and 'data' in message:
+        try:
+            readings = decode_batch(message)
+        except (zlib.error, ValueError, KeyError, IndexError, TypeError, OverflowError):
+            # base64 / JSON 錯誤都是 ValueError，過大的差分為 OverflowError；損壞的批次整筆略過
+            return
+    else:
+        readings = [dict(message, timestamp=transaction['timestamp'])]
+
+    for reading in readings:
+        timestamp = to_float(reading['timestamp'])
+        if not 0 <= timestamp <= MAX_TIMESTAMP:
+            # 無法分區的時間(含 NaN)略過這筆讀值
+            continue
+        if any(field in reading for field in ENV_FIELDS):
+            row = {'timestamp': timestamp, 'height': height, 'sender': sender}
+            for field, column in ENV_FIELDS.items():
+                row[column] = to_float(reading.get(field))
+            yield 'environment', row
+        elif 'id' in reading and 'weight' in reading:
+            yield 'weight', {'timestamp': timestamp, 'height': height, 'sender': sender,
+                             'pig_id': str(reading['id']), 'weight': to_float(reading['weight'])}
+
+
+class ColumnarExporter:
+    """把已確認區塊中的感測資料增量寫成欄式檔案，依感測器類型與日期(UTC)分區
+
+    目錄結構為 sensor=<類型>/date=<YYYY-MM-DD>/part-<起始高度>-<結束高度>，
+    有 pyarrow 時為 Parquet 檔，否則為每個欄位一個原始二進位檔(字串欄位為
+    換行分隔的文字)。同一段高度重新匯出會覆寫同名檔案，中斷後重跑不會重複。
+    """
+
+    def __init__(self, out_dir, confirmations=6, batch_size=500):
+        self.out_dir = out_dir
+        # 只匯出距離鏈頂至少 confirmations 個區塊的資料，避免分岔重組
+        self.confirmations = confirmations
+        self.batch_size = batch_size
+        self.state_path = os.path.join(out_dir, '_state.json')
+        self.height, self.last_hash = 0, None
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.height, self.last_hash = state['height'], state['hash']
+        self.stop_event = threading.Event()
+
+    def save_state(self):
+        path = self.state_path + '.tmp'
+        with open(path, 'w') as f:
+            json.dump({"height": self.height, "hash": self.last_hash}, f)
+        os.replace(path, self.state_path)
+
+    def export_blocks(self, start, blocks):
+        """blocks 為從高度 start 開始連續的區塊字典，回傳寫出的資料列數"""
+        if not blocks:
+            return 0
+        if self.last_hash is not None and blocks[0]['previous_hash'] != self.last_hash:
+            print(f"Warning: block {start} does not extend the last exported block, "
+                  f"a reorg deeper than {self.confirmations} blocks may have happened")
+
+        partitions = {}
+        for height, block in enumerate(blocks, start):
+            for transaction in block['transactions']:
+                for sensor, row in sensor_rows(transaction, height):
+                    day = time.strftime('%Y-%m-%d', time.gmtime(row['timestamp']))
+                    partitions.setdefault((sensor, day), []).append(row)
+
+        end = start + len(blocks) - 1
+        for (sensor, day), rows in partitions.items():
+            directory = os.path.join(self.out_dir, f"sensor={sensor}", f"date={day}")
+            os.makedirs(directory, exist_ok=True)
+            self.write_part(os.path.join(directory, f"part-{start:08d}-{end:08d}"), SCHEMAS[sensor], rows)
+
+        self.height, self.last_hash = end + 1, blocks[-1]['hash']
+        self.save_state()
+        return sum(len(rows) for rows in partitions.values())
+
+    def write_part(self, path, schema, rows):
+        if HAS_PYARROW:
+            import pyarrow
+            import pyarrow.parquet as parquet
+
+            types = {'d': pyarrow.float64(), 'q': pyarrow.int64(), 's': pyarrow.string()}
+            table = pyarrow.table({name: pyarrow.array([row[name] for row in rows], types[code])
+                                   for name, code in schema})
+            parquet.write_table(table, path + '.parquet', compression='zstd')
+            return
+
+        os.makedirs(path, exist_ok=True)
+        for name, code in schema:
+            values = [row[name] for row in rows]
+            if code == 's':
+                with open(os.path.join(path, name + '.txt'), 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(values) + '\n')
+                continue
+            column = array(code, values)
+            if sys.byteorder != 'little':
+                column.byteswap()
+            with open(os.path.join(path, name + '.bin'), 'wb') as f:
+                column.tofile(f)
+        with open(os.path.join(path, '_schema.json'), 'w') as f:
+            json.dump({"rows": len(rows),
+                       "columns": {name: NUMPY_TYPES.get(code, 'str') for name, code in schema}}, f)
+
+    def export_chain(self, blockchain):
+        """與節點同一個 process 時直接讀取 BlockChain 的主鏈"""
+        chain = blockchain.chain
+        end = len(chain) - self.confirmations
+        if self.height < blockchain.pruned_height:
+            print(f"Warning: blocks {self.height}-{blockchain.pruned_height - 1} are pruned, "
+                  f"export them from the pruning archive instead")
+            self.height, self.last_hash = blockchain.pruned_height, None
+        rows = 0
+        while self.height < end:
+            start = self.height
+            blocks = [chain[height].to_dict() for height in range(start, min(start + self.batch_size, end))]
+            rows += self.export_blocks(start, blocks)
+        return rows
+
+    def export_node(self, node_url, timeout=30):
+        """從節點的 /get_headers 與 /get_blocks 下載新確認的區塊"""
+        import requests
+        import wire
+
+        rows = 0
+        while True:
+            response = requests.get(f"{node_url}/get_headers", params={"start": self.height, "count": self.batch_size},
+                                    headers=wire.client_headers(), timeout=timeout, stream=True)
+            data = wire.decode_response(response)
+            end = data['height'] - self.confirmations
+            hashes = [header['hash'] for header in data['headers'] if header['height'] < end]
+            if not hashes:
+                return rows
+            response = requests.post(f"{node_url}/get_blocks", json={"hashes": hashes},
+                                     headers=wire.client_headers(), timeout=timeout, stream=True)
+            blocks = wire.decode_response(response)['blocks']
+            if not blocks:
+                # 節點已修剪這段區塊，只能略過
+                print(f"Warning: node has pruned block {self.height}, skipping to the next header")
+                self.height, self.last_hash = self.height + 1, None
+                continue
+            rows += self.export_blocks(self.height, blocks)
+
+    def start(self, blockchain, interval=60.0):
+        """在節點旁以背景執行緒定時匯出"""
+        def run():
+            while not self.stop_event.wait(interval):
+                try:
+                    rows = self.export_chain(blockchain)
+                    if rows:
+                        print(f"Exported {rows} sensor rows up to height {self.height}")
+                except Exception as e:
+                    print(f"Columnar export failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export on-chain sensor history to partitioned columnar files")
+    parser.add_argument("--node", default="http://localhost:8000", help="node to read confirmed blocks from")
+    parser.add_argument("--out", default="analytics", help="output directory")
+    parser.add_argument("--confirmations", type=int, default=6)
+    parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                        help="keep polling the node at this interval instead of exiting")
+    args = parser.parse_args()
+
+    exporter = ColumnarExporter(args.out, args.confirmations)
+    print(f"Writing {'Parquet' if HAS_PYARROW else 'raw column'} files to {os.path.abspath(args.out)}")
+    while True:
+        rows = exporter.export_node(args.node)
+        print(f"Exported {rows} sensor rows, next height {exporter.height}")
+        if not args.follow:
+            break
+        time.sleep(args.follow)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import hashlib
+
+
+def merkle_root(leaves):
+    """以 SHA-1 兩兩合併交易字串，計算 Merkle root"""
+    level = [hashlib.sha1(leaf.encode("utf-8")).digest() for leaf in leaves]
+    if not level:
+        return hashlib.sha1(b'').hexdigest()
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha1(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def block_header(previous_hash, timestamp, merkle_root, target):
+    """雜湊內容中與 nonce 無關的部分；只靠 header 就能檢查工作量"""
+    return previous_hash + str(timestamp) + merkle_root + '%040x' % target
+
+
+def header_hash(header, nonce):
+    return hashlib.sha1((header + str(nonce)).encode("utf-8")).hexdigest()
+
+
+def check_headers(headers, previous_hash):
+    """檢查一段 header 的雜湊、工作量與前後連結，回傳第一個錯誤的位置，全部正確時回傳 None
+
+    放在模組最上層，讓同步時可以交給 process pool 平行執行。
+    """
+    for idx, header in enumerate(headers):
+        target = int(header['target'], 16)
+        expected = header_hash(block_header(header['previous_hash'], header['timestamp'],
+                                            header['merkle_root'], target), header['nonce'])
+        if (header['previous_hash'] != previous_hash
+                or expected != header['hash']
+                or int(header['hash'], 16) > target):
+            return idx
+        previous_hash = header['hash']
+    return None
@@ -0,0 +1,79 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 名稱 -> (執行目錄, 啟動程式碼, 預算毫秒)；{key} 會換成暫存的礦工私鑰檔
+TARGETS = {
+    'client_1': ('pig_farm', 'import client_1', 60),
+    'client_2': ('pig_farm', 'import client_2', 60),
+    'aggregator': ('pig_farm', 'import aggregator', 40),
+    'server': ('blockchain', 'import server', 260),
+    'asgi': ('blockchain', 'import asgi', 340),
+    'node': ('blockchain', 'import server\n'
+                           'block = server.BlockChain()\n'
+                           'block.miner_key_path = {key!r}\n'
+                           'block.generate_address()', 300),
+}
+# 子行程內計時，不含直譯器本身的啟動
+TIMER = 'import time\nstart = time.perf_counter()\n{code}\nprint((time.perf_counter() - start) * 1000)\n'
+
+
+def run(directory, code):
+    result = subprocess.run([sys.executable, '-c', TIMER.format(code=code)], cwd=os.path.join(ROOT, directory),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1])
+
+
+def slowest_imports(directory, code, count):
+    """以 -X importtime 列出累計時間最長的模組"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=os.path.join(ROOT, directory),
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        if parts[2].strip() == 'site':
+            # 在 site 之前(含)的模組屬於直譯器啟動
+            modules = []
+            continue
+        modules.append((int(parts[1]) / 1000, parts[2].rstrip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start time of the node and clients against budgets")
+    parser.add_argument("targets", nargs="*", default=list(TARGETS), help=f"any of {', '.join(TARGETS)}")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, for slower machines")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports of each target")
+    args = parser.parse_args()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        key = os.path.join(tmp, 'miner.pem')
+        for name in args.targets:
+            directory, code, budget = TARGETS[name]
+            code = code.format(key=key)
+            # 第一次執行會編譯 .pyc 並產生礦工私鑰，不列入統計
+            run(directory, code)
+            median = statistics.median(run(directory, code) for _ in range(args.runs))
+            budget *= args.scale
+            ok = median <= budget
+            if not ok:
+                failed.append(name)
+            print(f"{name:<12}{median:>8.1f} ms  budget {budget:>6.0f} ms  {'ok' if ok else 'OVER BUDGET'}")
+            if args.top:
+                for elapsed, module in slowest_imports(directory, code, args.top):
+                    print(f"    {elapsed:>8.1f} ms {module}")
+    if failed:
+        print(f"Over budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import threading
+
+from block_size import transaction_size
+
+
+class Mempool:
+    """以鎖保護的待處理交易池，HTTP 執行緒與挖礦執行緒共用"""
+
+    def __init__(self, duplicate_window=300):
+        self._lock = threading.Lock()
+        self._transactions = []
+        # (sender, message) -> 池中這些交易的時間戳列表，取代逐筆掃描的重複檢查；
+        # 相隔超過 duplicate_window 的相同訊息是不同的交易，可以同時存在
+        self._index = {}
+        # 交易池中所有交易序列化後的總 bytes，區塊容量依此計算
+        self.backlog_bytes = 0
+        self.duplicate_window = duplicate_window
+        # 有新交易加入時呼叫，例如通知挖礦行程更新區塊模板
+        self.listeners = []
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def _key(self, transaction):
+        return (transaction.sender, transaction.message)
+
+    def add(self, transaction):
+        """加入交易，若 duplicate_window 秒內已有相同交易則回傳 False"""
+        key = self._key(transaction)
+        # 在鎖外序列化，挑選區塊交易時直接使用快取的大小
+        size = transaction_size(transaction)
+        with self._lock:
+            timestamps = self._index.get(key, ())
+            if any(abs(timestamp - transaction.timestamp) < self.duplicate_window for timestamp in timestamps):
+                return False
+            self._index.setdefault(key, []).append(transaction.timestamp)
+            self._transactions.append(transaction)
+            self.backlog_bytes += size
+        for listener in self.listeners:
+            listener()
+        return True
+
+    def take(self, select):
+        """以 select(交易列表, 總 bytes) 挑出前段交易並自交易池移除，回傳 select 的結果"""
+        with self._lock:
+            result = select(self._transactions, self.backlog_bytes)
+            taken = result[0]
+            self._transactions = self._transactions[len(taken):]
+            for transaction in taken:
+                self._forget(transaction)
+            return result
+
+    def restore(self, transactions):
+        """將未被挖出的交易放回交易池前端，保持原本順序；只略過池中已有的同一筆交易
+
+        這些交易先前已被接受，取出期間加入的相同訊息(時間相隔超過 duplicate_window)
+        是另一筆交易，不能因此丟掉原本的交易。
+        """
+        if not transactions:
+            return
+        with self._lock:
+            restored = []
+            for transaction in transactions:
+                timestamps = self._index.setdefault(self._key(transaction), [])
+                if transaction.timestamp in timestamps:
+                    continue
+                timestamps.append(transaction.timestamp)
+                restored.append(transaction)
+                self.backlog_bytes += transaction_size(transaction)
+            self._transactions = restored + self._transactions
+
+    def remove(self, transactions):
+        """移除已經被其他節點挖出的交易"""
+        keys = set(tx.key() for tx in transactions)
+        with self._lock:
+            remaining = []
+            for transaction in self._transactions:
+                if transaction.key() in keys:
+                    self._forget(transaction)
+                else:
+                    remaining.append(transaction)
+            self._transactions = remaining
+
+    def _forget(self, transaction):
+        self.backlog_bytes -= transaction_size(transaction)
+        key = self._key(transaction)
+        timestamps = self._index.get(key)
+        if timestamps is not None and transaction.timestamp in timestamps:
+            timestamps.remove(transaction.timestamp)
+            if not timestamps:
+                del self._index[key]
+
+    def expire(self, cutoff):
+        """移除時間早於 cutoff 的交易，回傳被移除的交易"""
+        with self._lock:
+            expired = [tx for tx in self._transactions if tx.timestamp < cutoff]
+            if expired:
+                self._transactions = [tx for tx in self._transactions if tx.timestamp >= cutoff]
+                for transaction in expired:
+                    self._forget(transaction)
+        return expired
+
+    def oldest_timestamp(self):
+        with self._lock:
+            return min((tx.timestamp for tx in self._transactions), default=None)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._transactions)
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+
+
+class MempoolLog:
+    """已接受交易的 write-ahead log，節點當掉重啟後把尚未上鏈的交易放回交易池
+
+    發送者登記也記在 log 中({"register": [公鑰, 演算法]})，重播時先於交易載入，
+    否則單一節點重啟後不認得任何發送者。append() 在記錄 fsync 之後才返回。同時送來的交易以 group commit 合併：
+    第一個等待的執行緒負責寫入並 fsync 目前累積的所有記錄，其他執行緒只等待，
+    一次 fsync 的成本由整批交易分攤。已上鏈的交易在 compact() 時移除，但保留
+    最近 keep_blocks 個區塊中的交易，避免區塊還沒傳出去節點就當掉。
+    """
+
+    def __init__(self, blockchain, path, keep_blocks=6, compact_records=1000):
+        self.blockchain = blockchain
+        self.path = path
+        self.keep_blocks = keep_blocks
+        # log 中的記錄超過這個數量(且超過存活交易的兩倍)才重寫
+        self.compact_records = compact_records
+        self.file = open(path, 'ab')
+        self.records = 0
+        self.cond = threading.Condition()
+        # 正在累積的一批記錄；寫入者取走後換成新的一批
+        self.batch = self.new_batch()
+        self.flushing = False
+        # 重播時發送者仍未登記的交易，每次重寫都原樣保留，下次重啟再試
+        self.unreplayed = []
+        blockchain.mempool_log = self
+
+    @staticmethod
+    def encode_record(record):
+        return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+    @classmethod
+    def encode(cls, transaction):
+        return cls.encode_record(transaction.to_dict())
+
+    @staticmethod
+    def new_batch():
+        return {'lines': [], 'done': False, 'error': None}
+
+    def append(self, transaction):
+        self.commit(self.encode(transaction))
+
+    def append_sender(self, public_key, scheme):
+        self.commit(self.encode_record({'register': [public_key, scheme]}))
+
+    def commit(self, line):
+        """寫入並 fsync 後返回；失敗時整批記錄都捨棄，同一批的每個呼叫者都會收到 OSError"""
+        with self.cond:
+            batch = self.batch
+            batch['lines'].append(line)
+            while not batch['done']:
+                if self.flushing:
+                    self.cond.wait()
+                    continue
+                # 成為這一批的寫入者，寫入期間其他執行緒繼續排入下一批
+                self.flushing = True
+                self.batch = self.new_batch()
+                self.cond.release()
+                try:
+                    self.write(batch['lines'])
+                except (OSError, ValueError) as e:
+                    # ValueError：先前重新開啟失敗，檔案已關閉
+                    batch['error'] = e
+                self.cond.acquire()
+                if batch['error'] is None:
+                    self.records += len(batch['lines'])
+                batch['done'] = True
+                self.flushing = False
+                self.cond.notify_all()
+        if batch['error'] is not None:
+            # 呼叫者會把交易移出交易池，記錄不能留在 log 中由下一批重試
+            raise OSError(f"Cannot write {self.path}: {batch['error']}")
+
+    def write(self, lines):
+        """寫入並 fsync；失敗時把檔案截回寫入前的長度，避免半筆記錄與下一批黏在一起"""
+        offset = self.file.tell()
+        try:
+            self.file.write(b''.join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = open(self.path, 'ab')
+            self.file.truncate(offset)
+            raise
+
+    def compact(self, force=False):
+        """重寫 log，只保留發送者登記、交易池與最近幾個區塊的交易；需在挖礦迴圈的兩輪之間呼叫
+
+        挖礦中的區塊模板已從交易池取出，其他時間點重寫會漏掉模板中的交易。
+        """
+        if not force and self.records < self.compact_records:
+            return False
+        with self.cond:
+            while self.flushing:
+                self.cond.wait()
+            chain = self.blockchain.chain
+            # 持有 cond 時沒有新的記錄能寫入舊檔案，交易池的快照不會漏掉交易
+            live = self.blockchain.mempool.snapshot() + \
+                [tx for block in chain[-self.keep_blocks:] for tx in block.transactions]
+            senders = sorted(self.blockchain.authorized_senders.values())
+            kept = len(senders) + len(self.unreplayed) + len(live)
+            if not force and self.records < 2 * kept:
+                return False
+            path = self.path + '.tmp'
+            with open(path, 'wb') as f:
+                f.write(b''.join(self.encode_record({'register': list(sender)}) for sender in senders))
+                # 無法重播的記錄不能在重寫時遺失
+                f.write(b''.join(self.encode_record(data) for data in self.unreplayed))
+                f.write(b''.join(self.encode(tx) for tx in live))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path, self.path)
+            self.file.close()
+            self.file = open(self.path, 'ab')
+            self.records = kept
+        return True
+
+    def replay(self):
+        """啟動時(同步或載入 snapshot 之後)先載入發送者登記，再把尚未上鏈的交易放回交易池，回傳筆數"""
+        senders, transactions = [], []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 寫到一半當掉的記錄
+                    continue
+                if 'register' in record:
+                    senders.append(record['register'])
+                else:
+                    transactions.append(record)
+        self.blockchain.load_senders(senders)
+        count, self.unreplayed = self.blockchain.load_pending(transactions)
+        self.compact(force=True)
+        print(f"Replayed {len(senders)} sender registrations and {count} pending transactions from {self.path}")
+        if self.unreplayed:
+            print(f"Kept {len(self.unreplayed)} transactions of unknown senders in {self.path}")
+        return count
@@ -0,0 +1,159 @@
+import bisect
+import threading
+import time
+
+from block_tree import block_work
+
+
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        # 有 label 時每個值各自計數，例如每種拒絕原因
+        self.label = label
+        self.values = {'': 0} if label is None else {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, label_value=''):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for label_value, value in values:
+            yield self.name, f'{{{self.label}="{label_value}"}}' if self.label else '', value
+
+
+class Gauge:
+    """數值在輸出時才由 function 計算，熱路徑上沒有任何成本"""
+
+    def __init__(self, name, help_text, function):
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+
+    def samples(self):
+        value = self.function()
+        if value is not None:
+            yield self.name, '', value
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = list(buckets)
+        # 有 label 時每個值各自一組計數，例如每個路由
+        self.label = label
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, label_value=''):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            child = self.children.get(label_value)
+            if child is None:
+                child = self.children[label_value] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            child[0][index] += 1
+            child[1] += 1
+            child[2] += value
+
+    def samples(self):
+        with self.lock:
+            children = [(label_value, list(counts), count, total)
+                        for label_value, (counts, count, total) in self.children.items()]
+        for label_value, counts, count, total in children:
+            label = f'{self.label}="{label_value}",' if self.label else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ['+Inf'], counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', f'{{{label}le="{bound}"}}', cumulative
+            label = f'{{{label[:-1]}}}' if label else ''
+            yield f'{self.name}_count', label, count
+            yield f'{self.name}_sum', label, total
+
+
+class NodeMetrics:
+    """節點內部的效能指標，以 Prometheus 文字格式輸出於 /metrics"""
+
+    def __init__(self, blockchain, hash_rate_window=20):
+        self.blockchain = blockchain
+        self.hash_rate_window = hash_rate_window
+        self.hashes = Counter(
+            'blockchain_hashes_total', 'Hashes computed by the miner thread or mining processes')
+        self.duplicates = Counter(
+            'blockchain_duplicate_transactions_total', 'Transactions rejected as duplicates')
+        self.rejected = Counter(
+            'http_requests_rejected_total', 'Ingest requests rejected by admission control', label='reason')
+        self.block_interval = Histogram(
+            'blockchain_block_interval_seconds', 'Seconds between consecutive main chain blocks',
+            [1, 2, 3, 5, 8, 13, 21, 34, 60, 120])
+        self.signature_seconds = Histogram(
+            'blockchain_signature_verify_seconds', 'Time spent verifying one transaction signature',
+            [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05])
+        self.chain_response_bytes = Histogram(
+            'blockchain_get_chain_response_bytes', 'Size of /get_chain responses',
+            [2 ** i for i in range(10, 27, 2)])
+        self.chain_response_seconds = Histogram(
+            'blockchain_get_chain_seconds', 'Time to build and serialize /get_chain responses',
+            [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5])
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency per route',
+            [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5], label='route')
+
+        stats = blockchain.block_stats
+        self.metrics = [
+            self.hashes,
+            Gauge('blockchain_hash_rate', 'Network hash rate estimated from recent block work',
+                  self.hash_rate),
+            Gauge('blockchain_difficulty', 'Difficulty of the block being mined',
+                  lambda: blockchain.difficulty),
+            Gauge('blockchain_height', 'Number of blocks in the main chain',
+                  lambda: len(blockchain.chain)),
+            self.block_interval,
+            Gauge('blockchain_mempool_transactions', 'Pending transactions',
+                  lambda: len(blockchain.mempool)),
+            Gauge('blockchain_mempool_oldest_age_seconds', 'Age of the oldest pending transaction',
+                  self.mempool_age),
+            Gauge('blockchain_block_fill_rate', 'Average fill rate of recent blocks',
+                  stats.fill_rate),
+            Gauge('blockchain_backlog_bytes', 'Pending bytes left after the last block template',
+                  lambda: stats.backlog_bytes),
+            self.signature_seconds,
+            self.duplicates,
+            self.rejected,
+            Gauge('http_ingest_inflight_requests', 'Transaction requests being processed',
+                  lambda: blockchain.admission.inflight if blockchain.admission is not None else None),
+            self.chain_response_bytes,
+            self.chain_response_seconds,
+            self.request_seconds,
+        ]
+
+    def hash_rate(self):
+        chain = self.blockchain.chain
+        blocks = chain[-self.hash_rate_window:]
+        if len(blocks) < 2:
+            return None
+        elapsed = blocks[-1].timestamp - blocks[0].timestamp
+        if elapsed <= 0:
+            return None
+        return sum(block_work(block.target) for block in blocks[1:]) / elapsed
+
+    def mempool_age(self):
+        oldest = self.blockchain.mempool.oldest_timestamp()
+        return 0 if oldest is None else max(0, time.time() - oldest)
+
+    def observe_chain_response(self, size, seconds):
+        self.chain_response_bytes.observe(size)
+        self.chain_response_seconds.observe(seconds)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            kind = type(metric).__name__.lower()
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
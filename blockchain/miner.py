@@ -0,0 +1,193 @@
+import hashlib
+import multiprocessing
+import random
+import struct
+import threading
+import time
+from multiprocessing.connection import wait
+
+from signatures import sender_id
+
+# 每嘗試多少個 nonce 檢查一次是否有新的區塊模板
+CHECK_INTERVAL = 4096
+# 子行程至少每隔多少秒回報一次嘗試過的 nonce 數，供 blockchain_hashes_total 使用
+REPORT_INTERVAL = 1.0
+
+# 區塊模板：job_id、門檻(20 bytes, big-endian)，後面接 header 原始 bytes
+TEMPLATE = struct.Struct('<Q20s')
+# 挖礦結果或進度回報：job_id、上次回報後嘗試的 nonce 數、是否找到、nonce、SHA-1 digest
+RESULT = struct.Struct('<QQ?Q20s')
+NO_DIGEST = bytes(20)
+
+
+def encode_template(job_id, target, header):
+    return TEMPLATE.pack(job_id, target.to_bytes(20, 'big')) + header.encode('utf-8')
+
+
+def decode_template(view):
+    """回傳 (job_id, target, header)，header 為指向原 buffer 的 memoryview，不複製"""
+    job_id, target = TEMPLATE.unpack_from(view)
+    return job_id, int.from_bytes(target, 'big'), view[TEMPLATE.size:]
+
+
+def proof_of_work(header, target, nonce, interrupted):
+    """尋找符合門檻的 nonce，回傳 (nonce, digest, 嘗試次數)
+
+    interrupted(目前的嘗試次數) 為真時放棄並回傳 (None, None, 嘗試次數)。
+    """
+    # header 只需雜湊一次，每個 nonce 複製雜湊狀態後補上 nonce 即可
+    base = hashlib.sha1(header)
+    first = nonce
+    while True:
+        s = base.copy()
+        s.update(str(nonce).encode('utf-8'))
+        digest = s.digest()
+        if int.from_bytes(digest, 'big') <= target:
+            return nonce, digest, nonce - first + 1
+        nonce += 1
+        if nonce % CHECK_INTERVAL == 0 and interrupted(nonce - first):
+            return None, None, nonce - first
+
+
+def miner_worker(conn):
+    """挖礦子行程：從 conn 接收區塊模板並回傳找到的 nonce，收到空訊息時結束"""
+    buffer = bytearray(65536)
+    while True:
+        try:
+            size = conn.recv_bytes_into(buffer)
+        except multiprocessing.BufferTooShort as e:
+            buffer = bytearray(e.args[0])
+            size = len(buffer)
+        except EOFError:
+            break
+        if not size:
+            break
+
+        with memoryview(buffer)[:size] as view:
+            job_id, target, header = decode_template(view)
+            reported, reported_at = 0, time.monotonic()
+
+            def interrupted(attempts):
+                nonlocal reported, reported_at
+                now = time.monotonic()
+                if now - reported_at >= REPORT_INTERVAL:
+                    conn.send_bytes(RESULT.pack(job_id, attempts - reported, False, 0, NO_DIGEST))
+                    reported, reported_at = attempts, now
+                # 有新模板送達時 conn.poll() 為真，立即放棄舊模板
+                return conn.poll()
+
+            nonce, digest, attempts = proof_of_work(header, target, random.getrandbits(32), interrupted)
+            header.release()
+        # 放棄的模板也回報嘗試次數
+        conn.send_bytes(RESULT.pack(job_id, attempts - reported, nonce is not None, nonce or 0,
+                                    digest or NO_DIGEST))
+
+
+class ProcessMiner:
+    """在獨立行程中挖礦，API 行程只負責組裝區塊模板與驗證結果"""
+
+    def __init__(self, blockchain, workers=1, template_interval=0.2):
+        self.blockchain = blockchain
+        self.workers = workers
+        # 有新交易時，最快每隔多少秒更新一次模板
+        self.template_interval = template_interval
+        self.context = multiprocessing.get_context('spawn')
+        self.connections = []
+        self.processes = []
+        self.job_id = 0
+        self.dispatched_at = 0
+        self.new_transactions = threading.Event()
+
+    def start(self):
+        for _ in range(self.workers):
+            conn, child_conn = self.context.Pipe()
+            process = self.context.Process(target=miner_worker, args=(child_conn,), daemon=True)
+            process.start()
+            self.connections.append(conn)
+            self.processes.append(process)
+
+        self.blockchain.mempool.listeners.append(self.new_transactions.set)
+        thread = threading.Thread(target=self.mining, daemon=True)
+        thread.start()
+
+    def stop(self):
+        for conn in self.connections:
+            conn.send_bytes(b'')
+        for process in self.processes:
+            process.join()
+
+    def dispatch(self, block):
+        self.job_id += 1
+        self.dispatched_at = time.time()
+        self.new_transactions.clear()
+        template = encode_template(self.job_id, block.target, self.blockchain.get_block_header(block))
+        for conn in self.connections:
+            conn.send_bytes(template)
+
+    def refresh(self, block):
+        """把新進交易放入模板：退回舊模板的交易後重新組裝"""
+        self.blockchain.return_transactions(block.transactions)
+        new_block = self.blockchain.create_block_template(block.miner)
+        self.dispatch(new_block)
+        return new_block
+
+    def wait_result(self, block):
+        """等待目前模板的結果，回傳 (區塊, 結果)；收到其他節點的區塊時結果為 None"""
+        while True:
+            if self.blockchain.receive_verified_block:
+                return block, None
+            if (self.new_transactions.is_set()
+                    and time.time() - self.dispatched_at >= self.template_interval):
+                block = self.refresh(block)
+
+            for conn in wait(self.connections, timeout=self.template_interval):
+                job_id, attempts, found, nonce, digest = RESULT.unpack(conn.recv_bytes())
+                if attempts:
+                    self.blockchain.metrics.hashes.inc(attempts)
+                # 舊模板的結果直接丟棄
+                if found and job_id == self.job_id:
+                    return block, (nonce, digest.hex())
+
+    def mine_block(self, miner):
+        start = time.time()
+        new_block = self.blockchain.create_block_template(miner)
+        self.dispatch(new_block)
+
+        new_block, result = self.wait_result(new_block)
+        if result is None:
+            print(f"[**] Verified received block. Mine next!")
+            self.blockchain.receive_verified_block = False
+            self.blockchain.return_transactions(new_block.transactions)
+            return False
+
+        new_block.nonce, new_block.hash = result
+        if self.blockchain.get_hash(new_block, new_block.nonce) != new_block.hash:
+            print("Error:Hash not matched!")
+            self.blockchain.return_transactions(new_block.transactions)
+            return False
+
+        self.blockchain.tracer.mark_transactions(new_block.transactions, 'pow')
+        time_consumed = round(time.time() - start, 5)
+        print(f"Hash: {new_block.hash} @ diff {self.blockchain.difficulty}; {time_consumed}s")
+        if not self.blockchain.append_block(new_block):
+            self.blockchain.return_transactions(new_block.transactions)
+            return False
+
+    def mining(self):
+        address, private = self.blockchain.generate_address()
+        miner = sender_id(address)
+        print(f"Miner address: {address}")
+        print(f"Miner id: {miner}")
+        print(f"Miner private: {private}")
+
+        while not self.blockchain.chain:
+            time.sleep(1)
+
+        profiler = self.blockchain.profiler
+        profiler.attach()
+        while(True):
+            profiler.checkpoint()
+            self.mine_block(miner)
+            self.blockchain.adjust_difficulty()
+            if self.blockchain.mempool_log is not None:
+                self.blockchain.mempool_log.compact()
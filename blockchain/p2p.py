@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from sync import HeaderSync
+from wire import client_headers, decode_response
+
+# 經由 /add_peer 加入的節點上限(總數與每個位址)，每個新區塊與交易都會廣播給所有節點
+MAX_PEERS = 32
+MAX_PEERS_PER_HOST = 4
+# 動態加入的節點連續失敗這麼多次就移除，空出名額
+MAX_FAILURES = 5
+
+class PeerNetwork:
+    """節點之間廣播新區塊 header、交易與發送者註冊"""
+
+    def __init__(self, blockchain, port, peers=(), timeout=3):
+        self.blockchain = blockchain
+        self.port = port
+        self.timeout = timeout
+        self.peers = set(peer.rstrip('/') for peer in peers)
+        # 設定檔指定的節點；經由 /add_peer 加入的節點不在此列，不能免除速率限制
+        self.static_peers = set(self.peers)
+        # 節點 -> 連續連線失敗次數
+        self.failures = {}
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        blockchain.network = self
+        self.synchronizer = HeaderSync(self)
+
+    def add_peer(self, url):
+        self.peers.add(url.rstrip('/'))
+
+    def reached(self, peer, ok):
+        """記錄連線結果，動態加入的節點連續失敗 MAX_FAILURES 次後移除"""
+        if ok:
+            self.failures.pop(peer, None)
+            return
+        self.failures[peer] = self.failures.get(peer, 0) + 1
+        if self.failures[peer] >= MAX_FAILURES and peer not in self.static_peers:
+            self.peers.discard(peer)
+            self.failures.pop(peer, None)
+            print(f"Dropped peer {peer} after {MAX_FAILURES} failed requests")
+
+    def connect(self):
+        """向已知節點登記自己，取得已授權的發送者，並從它們同步缺少的區塊"""
+        # requests 載入約 0.1 秒，沒有其他節點時不需要
+        import requests
+
+        for peer in list(self.peers):
+            try:
+                requests.post(f"{peer}/add_peer", json={"port": self.port}, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"Cannot connect to peer {peer}: {e}")
+            # 交易只帶 sender id，驗證區塊前需要知道對應的公鑰
+            data = self.get(peer, '/senders')
+            if data:
+                self.blockchain.load_senders(data['senders'])
+        self.synchronizer.sync(self.peers)
+
+    def broadcast(self, path, data, exclude=None):
+        for peer in list(self.peers):
+            if peer != exclude:
+                self.executor.submit(self.post, peer, path, data)
+
+    def post(self, peer, path, data):
+        import requests
+
+        try:
+            result = decode_response(requests.post(f"{peer}{path}", json=data, headers=client_headers(),
+                                                   timeout=self.timeout, stream=True))
+        except (requests.RequestException, ValueError) as e:
+            print(f"Cannot reach peer {peer}: {e}")
+            self.reached(peer, False)
+            return None
+        self.reached(peer, True)
+        return result
+
+    def get(self, peer, path, params=None):
+        # 同步大量 header / 區塊時以 MessagePack + zstd 傳輸
+        import requests
+
+        try:
+            result = decode_response(requests.get(f"{peer}{path}", params=params, headers=client_headers(),
+                                                  timeout=self.timeout, stream=True))
+        except (requests.RequestException, ValueError) as e:
+            print(f"Cannot reach peer {peer}: {e}")
+            self.reached(peer, False)
+            return None
+        self.reached(peer, True)
+        return result
+
+    def announce_block(self, block, height):
+        self.broadcast('/announce_block', {
+            "header": block.to_header_dict(height),
+            "port": self.port
+        })
+
+    def announce_transaction(self, transaction):
+        data = transaction.to_dict()
+        signature = data.pop('signature')
+        self.broadcast('/transaction', {"data": data, "signature": signature})
+
+    def announce_sender(self, public_key, scheme='rsa'):
+        self.broadcast('/register_sender', {"public_key": public_key, "scheme": scheme})
+
+    def receive_header(self, header, origin):
+        """收到新區塊的 header：已知前一個區塊就下載內容，否則重新同步"""
+        tree = self.blockchain.tree
+        if header['hash'] in tree:
+            return False, "Known block"
+
+        if header['previous_hash'] in tree:
+            data = self.get(origin, '/get_block', {"hash": header['hash']})
+            if not data or 'block' not in data:
+                return False, "Cannot fetch block"
+            result, message = self.blockchain.receive_block(data['block'])
+            if result:
+                print(f"[**] Received block {header['hash']} from {origin}")
+            return result, message
+
+        self.executor.submit(self.synchronizer.sync, [origin])
+        return False, "Unknown previous block, syncing"
+
+    def request_add_peer(self, data, remote_addr):
+        """登記呼叫者為節點；動態節點的數量有上限，避免任意位址與 port 灌爆廣播對象"""
+        try:
+            port = int(data['port'])
+        except (KeyError, TypeError, ValueError):
+            return {"success": False, "message": "A numeric port is required"}
+        if not 0 < port < 65536:
+            return {"success": False, "message": "Invalid port"}
+        url = f"http://{remote_addr}:{port}"
+        if url not in self.peers:
+            dynamic = [peer for peer in self.peers if peer not in self.static_peers]
+            same_host = sum(urlparse(peer).hostname == remote_addr for peer in dynamic)
+            if len(dynamic) >= MAX_PEERS or same_host >= MAX_PEERS_PER_HOST:
+                return {"success": False, "message": "Too many peers"}
+            self.add_peer(url)
+        return {
+            "success": True,
+            "peers": sorted(self.peers)
+        }
+
+    def request_announce_block(self, data, remote_addr):
+        try:
+            origin = f"http://{remote_addr}:{data['port']}"
+            result, message = self.receive_header(data['header'], origin)
+            return {
+                "success": result,
+                "message": message
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            }
+
+    def request_block(self, block_hash):
+        block = self.blockchain.tree.blocks.get(block_hash)
+        if block is None:
+            return {
+                "success": False,
+                "message": "Block not found"
+            }
+        return {
+            "success": True,
+            "block": block.to_dict()
+        }
+
+    def request_headers(self, start, count, max_count=2000):
+        chain = self.blockchain.chain
+        end = min(start + min(count, max_count), len(chain))
+        return {
+            "height": len(chain),
+            "work": str(self.blockchain.tree.work[chain[-1].hash]) if chain else "0",
+            "headers": [chain[i].to_header_dict(i) for i in range(max(start, 0), end)]
+        }
+
+    def request_blocks(self, data):
+        blocks = []
+        for block_hash in data.get('hashes', []):
+            block = self.blockchain.tree.blocks.get(block_hash)
+            # 已修剪的區塊沒有交易內容，讓對方改向其他節點下載
+            if block is None or block.pruned:
+                break
+            blocks.append(block.to_dict())
+        return {
+            "blocks": blocks
+        }
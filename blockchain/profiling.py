@@ -0,0 +1,88 @@
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+
+MODES = ('sample', 'cprofile')
+
+
+class MiningProfiler:
+    """挖礦執行緒的效能分析，可在執行中開關
+
+    "sample" 模式由另一個執行緒定時取樣挖礦執行緒的呼叫堆疊，輸出 flame graph
+    工具(flamegraph.pl、speedscope)可讀的 folded stacks；"cprofile" 模式需在挖礦
+    執行緒內開關，於下一次 checkpoint() (每個區塊一次)生效，停止時寫出 pstats 檔。
+    """
+
+    def __init__(self, interval=0.005, stats_path='mining.prof'):
+        self.interval = interval
+        self.stats_path = stats_path
+        self.thread_id = None
+        self.mode = None
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.sampler = None
+        self.profile = None
+        self.requested = None
+
+    def attach(self):
+        """在挖礦執行緒中呼叫，記錄要分析的執行緒"""
+        self.thread_id = threading.get_ident()
+
+    def start(self, mode='sample'):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if self.mode is not None:
+            return False
+        self.mode = mode
+        if mode == 'sample':
+            self.stacks.clear()
+            self.stop_event.clear()
+            self.sampler = threading.Thread(target=self.sample, daemon=True)
+            self.sampler.start()
+        else:
+            self.requested = 'enable'
+        return True
+
+    def stop(self):
+        if self.mode == 'sample':
+            self.stop_event.set()
+            self.sampler.join()
+        elif self.mode == 'cprofile':
+            self.requested = 'disable'
+        self.mode = None
+        return True
+
+    def checkpoint(self):
+        """挖礦迴圈每輪呼叫一次，套用 cProfile 的開關"""
+        if self.requested == 'enable':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.requested == 'disable' and self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.stats_path)
+            print(f"Saved mining profile to {os.path.abspath(self.stats_path)}")
+            self.profile = None
+        self.requested = None
+
+    def sample(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        return {
+            "mode": self.mode,
+            "samples": sum(self.stacks.values()),
+            "cprofile_active": self.profile is not None
+        }
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+
+
+class ChainPruner:
+    """把超過 horizon 個區塊之前的交易內容從記憶體移除，只保留 header 與 Merkle root
+
+    archive_dir 有設定時，被移除的交易會先寫入 gzip JSON lines 檔保存感測歷史。
+    """
+
+    def __init__(self, blockchain, horizon=1000, interval=100, archive_dir=None):
+        self.blockchain = blockchain
+        self.horizon = horizon
+        # 每新增多少個區塊執行一次
+        self.interval = interval
+        self.archive_dir = archive_dir
+        blockchain.pruner = self
+
+    def after_block(self, height):
+        if height % self.interval == 0:
+            self.prune()
+
+    def prune(self):
+        blockchain = self.blockchain
+        chain = blockchain.chain
+        end = len(chain) - self.horizon
+        start = blockchain.pruned_height
+        if end <= start:
+            return 0
+
+        blocks = [(height, chain[height]) for height in range(start, end)
+                  if chain[height].transactions]
+        if self.archive_dir and blocks:
+            self.archive(blocks)
+
+        with blockchain.chain_lock:
+            for height, block in blocks:
+                blockchain.unindex_transactions(block)
+                block.transactions = []
+                block.pruned = True
+            blockchain.pruned_height = end
+            # 同一高度範圍內的分岔已不可能成為主鏈
+            blockchain.tree.prune_side_branches(end, blockchain.block_index)
+        blockchain.pruned_timestamp = chain[end - 1].timestamp
+
+        print(f"Pruned {len(blocks)} blocks below height {end}")
+        return len(blocks)
+
+    def archive(self, blocks):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"transactions-{blocks[0][0]}-{blocks[-1][0]}.jsonl.gz")
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for height, block in blocks:
+                f.write(json.dumps({
+                    "height": height,
+                    "hash": block.hash,
+                    "merkle_root": block.merkle_root,
+                    "transactions": [tx.to_dict() for tx in block.transactions]
+                }) + '\n')
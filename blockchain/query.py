@@ -0,0 +1,244 @@
+import math
+import sqlite3
+import threading
+import time
+
+from exporter import SCHEMAS, sensor_rows
+
+AGGREGATES = {'avg': 'avg({})', 'min': 'min({})', 'max': 'max({})', 'sum': 'sum({})', 'count': 'count({})'}
+# 依時間先後取值的聚合，以 window function 計算
+ORDERED_AGGREGATES = ('first', 'last', 'change')
+GROUP_COLUMNS = {'environment': ('sender',), 'weight': ('sender', 'pig_id')}
+HAVING_OPERATORS = {'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+MAX_ROWS = 10000
+# 環境讀值另存每小時彙總，長時間範圍的查詢不必掃過每一筆讀值
+ROLLUP_SENSOR = 'environment'
+HOUR = 3600
+ROLLUP_AGGREGATES = {'avg': 'sum({0}_sum) / sum({0}_count)', 'min': 'min({0}_min)', 'max': 'max({0}_max)',
+                     'sum': 'sum({0}_sum)', 'count': 'sum({0}_count)'}
+
+
+def value_columns(sensor):
+    return [name for name, code in SCHEMAS[sensor] if code == 'd' and name != 'timestamp']
+
+
+class ReadingStore:
+    """主鏈上感測讀值的 SQLite 索引，供 /query 做時間範圍與分組聚合查詢
+
+    查詢前會先補上新區塊；主鏈重組時刪除被換掉高度以上的資料再重建。
+    資料表欄位與 exporter.py 的欄式檔案相同，path 預設為記憶體資料庫。
+    """
+
+    def __init__(self, blockchain, path=':memory:'):
+        self.blockchain = blockchain
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # 資料可由鏈重建，不需要每次寫入都 fsync
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.lock = threading.Lock()
+        for sensor, schema in SCHEMAS.items():
+            columns = ', '.join(f"{name} {'TEXT' if code == 's' else 'REAL' if code == 'd' else 'INTEGER'}"
+                                for name, code in schema)
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS {sensor} ({columns})')
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS {sensor}_time ON {sensor} (timestamp)')
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS {sensor}_height ON {sensor} (height)')
+            for column in GROUP_COLUMNS[sensor]:
+                self.db.execute(f'CREATE INDEX IF NOT EXISTS {sensor}_{column} ON {sensor} ({column}, timestamp)')
+        rollup = ', '.join(f'{field}_count INTEGER, {field}_sum REAL, {field}_min REAL, {field}_max REAL'
+                           for field in value_columns(ROLLUP_SENSOR))
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS {ROLLUP_SENSOR}_hourly '
+                        f'(sender TEXT, hour INTEGER, {rollup}, PRIMARY KEY (sender, hour))')
+        self.db.execute(f'CREATE INDEX IF NOT EXISTS {ROLLUP_SENSOR}_hourly_hour ON {ROLLUP_SENSOR}_hourly (hour)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS blocks (height INTEGER PRIMARY KEY, hash TEXT)')
+        self.db.commit()
+        self.height = self.db.execute('SELECT coalesce(max(height) + 1, 0) FROM blocks').fetchone()[0]
+        blockchain.reading_store = self
+
+    def sync(self):
+        """補上主鏈的新區塊，回傳新增的區塊數"""
+        chain = self.blockchain.chain
+        with self.lock:
+            # 從最後索引的區塊往回找仍在主鏈上的高度
+            height = self.height
+            while height > 0:
+                stored = self.db.execute('SELECT hash FROM blocks WHERE height = ?', (height - 1,)).fetchone()
+                if height - 1 < len(chain) and stored[0] == chain[height - 1].hash:
+                    break
+                height -= 1
+            hours = set()
+            if height < self.height:
+                hours.update(self.db.execute(
+                    f'SELECT DISTINCT sender, CAST(timestamp / {HOUR} AS INTEGER) * {HOUR} '
+                    f'FROM {ROLLUP_SENSOR} WHERE height >= ?', (height,)))
+                for sensor in SCHEMAS:
+                    self.db.execute(f'DELETE FROM {sensor} WHERE height >= ?', (height,))
+                self.db.execute('DELETE FROM blocks WHERE height >= ?', (height,))
+
+            rows = {sensor: [] for sensor in SCHEMAS}
+            for block_height in range(height, len(chain)):
+                for transaction in chain[block_height].transactions:
+                    for sensor, row in sensor_rows(transaction.to_dict(), block_height):
+                        rows[sensor].append(row)
+            hours.update(self.insert_rows(rows))
+            self.refresh_rollup(hours)
+            self.db.executemany('INSERT INTO blocks VALUES (?, ?)',
+                                ((h, chain[h].hash) for h in range(height, len(chain))))
+            self.db.commit()
+            added, self.height = len(chain) - height, len(chain)
+        return added
+
+    def insert_rows(self, rows):
+        """rows 為 sensor -> 資料列(與 exporter.sensor_rows 相同的字典)，回傳需要重算彙總的 (sender, hour)"""
+        for sensor, batch in rows.items():
+            names = [name for name, _ in SCHEMAS[sensor]]
+            self.db.executemany(f"INSERT INTO {sensor} VALUES ({', '.join('?' * len(names))})",
+                                ([row[name] for name in names] for row in batch))
+        return {(row['sender'], int(row['timestamp'] // HOUR) * HOUR) for row in rows.get(ROLLUP_SENSOR, [])}
+
+    def refresh_rollup(self, hours):
+        """由原始讀值重算這些 (sender, hour) 的彙總，新增與刪除讀值後都適用"""
+        aggregates = ', '.join(f'count({field}), sum({field}), min({field}), max({field})'
+                               for field in value_columns(ROLLUP_SENSOR))
+        for sender, hour in hours:
+            self.db.execute(f'DELETE FROM {ROLLUP_SENSOR}_hourly WHERE sender = ? AND hour = ?', (sender, hour))
+            self.db.execute(f'INSERT INTO {ROLLUP_SENSOR}_hourly SELECT sender, ?, {aggregates} '
+                            f'FROM {ROLLUP_SENSOR} WHERE sender = ? AND timestamp >= ? AND timestamp < ? '
+                            f'GROUP BY sender', (hour, sender, hour, hour + HOUR))
+
+    def start(self, interval=5.0):
+        """背景定時同步，讓查詢時只需補上最後幾個區塊"""
+        def run():
+            while True:
+                try:
+                    self.sync()
+                    # 讓 SQLite 依資料分布更新統計，選擇正確的索引
+                    with self.lock:
+                        self.db.execute('PRAGMA optimize')
+                except Exception as e:
+                    print(f"Reading store sync failed: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def build_query(self, data):
+        """把查詢參數轉成 SQL，欄位名稱只接受白名單中的值"""
+        if not isinstance(data, dict):
+            raise ValueError("Query must be a JSON object")
+        sensor = data.get('sensor', 'environment')
+        if sensor not in SCHEMAS:
+            raise ValueError(f"Unknown sensor {sensor}, expected one of {sorted(SCHEMAS)}")
+        values = value_columns(sensor)
+        fields = data.get('fields') or values
+        aggregates = data.get('aggregates') or ['avg']
+        for field in fields:
+            if field not in values:
+                raise ValueError(f"Unknown field {field} for {sensor}, expected one of {values}")
+        for aggregate in aggregates:
+            if aggregate not in AGGREGATES and aggregate not in ORDERED_AGGREGATES:
+                raise ValueError(f"Unknown aggregate {aggregate}")
+
+        group_by = data.get('group_by')
+        if group_by is not None and group_by not in GROUP_COLUMNS[sensor]:
+            raise ValueError(f"Cannot group {sensor} by {group_by}")
+        window = float(data['window']) if data.get('window') else None
+        if window is not None and not 0 < window < math.inf:
+            raise ValueError("window must be positive and finite")
+
+        # 時間範圍與 window 都對齊整點、且只用一般聚合時改查每小時彙總
+        bounds = [data.get('start'), data.get('end'), window]
+        rollup = sensor == ROLLUP_SENSOR and group_by in (None, 'sender') and \
+            all(aggregate in ROLLUP_AGGREGATES for aggregate in aggregates) and \
+            all(bound is None or float(bound) % HOUR == 0 for bound in bounds)
+        table, time_column = (f'{ROLLUP_SENSOR}_hourly', 'hour') if rollup else (sensor, 'timestamp')
+
+        where, params = [], []
+        if data.get('start') is not None:
+            where.append(f'{time_column} >= ?')
+            params.append(float(data['start']))
+        if data.get('end') is not None:
+            where.append(f'{time_column} < ?')
+            params.append(float(data['end']))
+        for column in GROUP_COLUMNS[sensor]:
+            if data.get(column) is not None:
+                where.append(f'{column} = ?')
+                params.append(str(data[column]))
+
+        keys, key_exprs = [], []
+        if group_by is not None:
+            keys.append(group_by)
+            key_exprs.append(group_by)
+        if window is not None:
+            keys.append('window_start')
+            key_exprs.append(f'CAST({time_column} / {window!r} AS INTEGER) * {window!r} AS window_start')
+
+        outputs, selects = [], []
+        for field in fields:
+            for aggregate in aggregates:
+                outputs.append(f'{aggregate}_{field}')
+                if aggregate == 'first':
+                    selects.append(f'max({field}__first)')
+                elif aggregate == 'last':
+                    selects.append(f'max({field}__last)')
+                elif aggregate == 'change':
+                    selects.append(f'max({field}__last) - max({field}__first)')
+                elif rollup:
+                    selects.append(ROLLUP_AGGREGATES[aggregate].format(field))
+                else:
+                    selects.append(AGGREGATES[aggregate].format(field))
+
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ''
+        if any(aggregate in ORDERED_AGGREGATES for aggregate in aggregates):
+            # window_start 要先在內層算好，PARTITION BY 才能引用
+            partition = f"PARTITION BY {', '.join(keys)} " if keys else ''
+            ordered = ', '.join(f'first_value({field}) OVER w AS {field}__first, '
+                                f'last_value({field}) OVER w AS {field}__last' for field in fields)
+            inner = f"SELECT {', '.join(key_exprs + ['timestamp'] + fields)} FROM {sensor}{where_sql}"
+            source = (f"(SELECT {', '.join(keys + fields)}, {ordered} FROM ({inner}) "
+                      f"WINDOW w AS ({partition}ORDER BY timestamp "
+                      f"ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING))")
+            sql = f"SELECT {', '.join(keys + [f'{s} AS {o}' for s, o in zip(selects, outputs)])} FROM {source}"
+        else:
+            sql = (f"SELECT {', '.join(key_exprs + [f'{s} AS {o}' for s, o in zip(selects, outputs)])} "
+                   f"FROM {table}{where_sql}")
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)}"
+
+        having = []
+        for output, conditions in (data.get('having') or {}).items():
+            if output not in outputs:
+                raise ValueError(f"Cannot filter on {output}, expected one of {outputs}")
+            for operator, value in conditions.items():
+                if operator not in HAVING_OPERATORS:
+                    raise ValueError(f"Unknown operator {operator}")
+                having.append(f'{output} {HAVING_OPERATORS[operator]} ?')
+                params.append(float(value))
+        if having:
+            sql += f" HAVING {' AND '.join(having)}"
+        if keys:
+            sql += f" ORDER BY {', '.join(keys)}"
+        limit = data.get('limit', 1000)
+        if isinstance(limit, float) and not math.isfinite(limit):
+            raise ValueError("limit must be finite")
+        # 負數的 LIMIT 在 SQLite 代表不限筆數，因此同時限制下限
+        sql += f" LIMIT {max(1, min(int(limit), MAX_ROWS))}"
+        return sql, params, keys + outputs
+
+    def query(self, data, prepared=None):
+        """prepared 為 build_query(data) 的結果，呼叫者已先驗證查詢內容時傳入"""
+        sql, params, columns = prepared or self.build_query(data)
+        self.sync()
+        start = time.perf_counter()
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+            elapsed = time.perf_counter() - start
+            plan = [row[3] for row in self.db.execute('EXPLAIN QUERY PLAN ' + sql, params)] \
+                if data.get('explain') else None
+        result = {
+            "columns": columns,
+            "rows": [list(row) for row in rows],
+            "elapsed_ms": round(elapsed * 1000, 3)
+        }
+        if plan is not None:
+            result["sql"] = sql
+            result["plan"] = plan
+        return result
@@ -0,0 +1,86 @@
+import argparse
+import math
+import random
+import time
+
+from query import ReadingStore
+from server import BlockChain
+
+DAY = 86400
+
+
+def populate(store, days, barns, pigs, interval, seed):
+    """直接寫入模擬的讀值，不經過挖礦"""
+    rng = random.Random(seed)
+    start = time.time() - days * DAY
+    senders = [f"barn-{i}" for i in range(barns)]
+    weights = {f"{rng.getrandbits(40)}": rng.uniform(20, 110) for _ in range(pigs)}
+    count = 0
+    for day in range(days):
+        environment = []
+        for offset in range(0, DAY, interval):
+            timestamp = start + day * DAY + offset
+            daily = math.sin(2 * math.pi * offset / DAY)
+            for sender in senders:
+                environment.append({'timestamp': timestamp, 'height': day, 'sender': sender,
+                                    'temperature': 25 + 3 * daily + rng.gauss(0, 0.2),
+                                    'humidity': 70 - 8 * daily + rng.gauss(0, 1.0),
+                                    'pm25': max(0.0, 30 + rng.gauss(0, 5))})
+        weight = []
+        for pig in weights:
+            # 約一成的豬停止增重
+            weights[pig] += rng.uniform(0, 0.6) if int(pig) % 10 else 0
+            weight.append({'timestamp': start + day * DAY + rng.uniform(0, DAY), 'height': day,
+                           'sender': senders[int(pig) % barns], 'pig_id': pig,
+                           'weight': weights[pig] + rng.gauss(0, 0.3)})
+        store.refresh_rollup(store.insert_rows({'environment': environment, 'weight': weight}))
+        count += len(environment) + len(weight)
+    store.db.commit()
+    store.db.execute('ANALYZE')
+    return count, senders, start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time typical /query dashboard queries on simulated history")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--barns", type=int, default=4)
+    parser.add_argument("--pigs", type=int, default=200)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between environment readings")
+    parser.add_argument("--db", default=":memory:")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    store = ReadingStore(BlockChain(), args.db)
+    begin = time.perf_counter()
+    count, senders, start = populate(store, args.days, args.barns, args.pigs, args.interval, args.seed)
+    print(f"Inserted {count} readings in {time.perf_counter() - begin:.1f}s")
+
+    # 儀表板的時間範圍對齊整點，可以使用每小時彙總
+    now = (start + args.days * DAY) // 3600 * 3600
+    queries = {
+        "avg PM2.5 of one barn, last week": {
+            "sensor": "environment", "sender": senders[0], "fields": ["pm25"],
+            "start": now - 7 * DAY, "end": now},
+        "hourly temperature of one barn, last day": {
+            "sensor": "environment", "sender": senders[0], "fields": ["temperature"],
+            "aggregates": ["avg", "min", "max"], "window": 3600, "start": now - DAY},
+        "daily avg per barn, last month": {
+            "sensor": "environment", "group_by": "sender", "window": DAY,
+            "start": now - 30 * DAY},
+        "stalled pigs, last two weeks": {
+            "sensor": "weight", "group_by": "pig_id", "fields": ["weight"], "aggregates": ["change"],
+            "start": now - 14 * DAY, "having": {"change_weight": {"lt": 1.0}}},
+        "weight history of one pig": {
+            "sensor": "weight", "pig_id": next(iter(store.db.execute('SELECT pig_id FROM weight LIMIT 1')))[0],
+            "fields": ["weight"], "aggregates": ["last"], "window": 7 * DAY}
+    }
+    for name, query in queries.items():
+        result = store.query(dict(query, explain=True))
+        runs = [store.query(query)["elapsed_ms"] for _ in range(5)]
+        print(f"{name:<45}{len(result['rows']):>6} rows {min(runs):>9.2f} ms")
+        for step in result["plan"]:
+            print(f"    {step}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,91 +1,278 @@
-import hashlib
-import sys
+import argparse
+import os
 import threading
 import time
 import random
 import base64
-import json
+import math
+import sqlite3
 
 import rsa
 
-from flask import Flask, request
+from admission import AdmissionControl
+from block_size import BlockSizePolicy, BlockStats
+from block_tree import BlockTree, BranchView
+from config import NodeConfig, add_arguments
+from hashing import block_header, header_hash, merkle_root
+from difficulty import (RetargetPolicy, check_proof_of_work, check_timestamp,
+                        difficulty_from_target, median_time_past, target_from_difficulty)
+from exporter import ColumnarExporter
+from mempool import Mempool
+from mempool_log import MempoolLog
+from miner import ProcessMiner
+from metrics import NodeMetrics
+from profiling import MiningProfiler
+from p2p import PeerNetwork
+from pruning import ChainPruner
+from query import ReadingStore
+from signatures import available_schemes, detect_scheme, sender_id
+from snapshot import load_snapshot, snapshot_bytes
+from tracing import NULL_TRACE, Tracer
+from wire import MAX_BODY_SIZE, decode_body, encode_response
+
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 
 app = Flask(__name__)
+# 超過上限的請求在讀取前就以 413 拒絕
+app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_SIZE
 CORS(app)
 
+# 交易時間與節點時鐘(驗證區塊時為區塊時間)的容許範圍，秒
+TRANSACTION_MAX_FUTURE = 300
+TRANSACTION_MAX_AGE = 3600
+
 class Transaction:
-    def __init__(self, sender, message, timestamp=None):
+    def __init__(self, sender, message, timestamp=None, signature=None, version=1):
         self.sender = sender
         self.message = message
         self.timestamp = timestamp or int(time.time())
+        self.signature = signature  # base64 簽名，讓其他節點可以驗證區塊內的交易
+        # 1: 只簽 sender 與 message；2: 時間也在簽章範圍內，無法改時間重送
+        self.version = version
+        self.trace = None  # 被抽樣追蹤時的 Trace
+        self.size = None  # 序列化後的 byte 數，由 block_size.transaction_size 快取
     
     def __repr__(self):  
         return '{ "sender": "%s", "message": "%s", "timestamp": "%s" }' % (
             self.sender, self.message, self.timestamp)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, signature=True):
+        data = {
             'sender': self.sender,
             'message': self.message,
             'timestamp': self.timestamp
         }
+        if signature:
+            data['signature'] = self.signature
+        # 舊版交易維持原本的格式
+        if self.version != 1:
+            data['version'] = self.version
+        return data
+
+    def key(self):
+        return (self.sender, self.message, self.timestamp)
 
     @classmethod
     def from_dict(cls, data):
-        return cls(data['sender'], data['message'])
+        return cls(data['sender'], data['message'], data.get('timestamp'), data.get('signature'),
+                   data.get('version', 1))
 
 class Block:
-    def __init__(self, previous_hash, difficulty, miner, miner_rewards):
+    def __init__(self, previous_hash, difficulty, miner, miner_rewards, target=None):
         self.previous_hash = previous_hash
         self.hash = ''
         self.difficulty = difficulty
+        self.target = target if target is not None else target_from_difficulty(difficulty)
         self.nonce = 0
         self.timestamp = int(time.time())
         self.transactions = []
+        self.merkle_root = merkle_root([])
+        self.pruned = False  # 交易內容已被移除，只剩 header
         self.miner = miner
         self.miner_rewards = miner_rewards
 
     def __repr__(self):  
         return '{ "hash": "%s", "transactions": %s }' % (self.hash, str(self.transactions))
     
-    def to_dict(self):
-        """將 Block 轉換為字典格式以便 JSON 序列化"""
+    def to_dict(self, signatures=True):
+        """將 Block 轉換為字典格式以便 JSON 序列化；signatures=False 時省略交易簽章(公開查詢用)"""
         return {
             'previous_hash': self.previous_hash,
             'hash': self.hash,
             'difficulty': self.difficulty,
+            'target': '%040x' % self.target,
             'nonce': self.nonce,
             'timestamp': self.timestamp,
-            'transactions': [tx.to_dict() for tx in self.transactions],
+            'merkle_root': self.merkle_root,
+            'pruned': self.pruned,
+            'transactions': [tx.to_dict(signatures) for tx in self.transactions],
             'miner': self.miner,
             'miner_rewards': self.miner_rewards
         }
 
+    def to_header_dict(self, height):
+        """區塊宣告只帶 header，內容由對方需要時再下載"""
+        header = self.to_dict()
+        del header['transactions']
+        header['height'] = height
+        return header
+
+    @classmethod
+    def from_dict(cls, data):
+        block = cls(data['previous_hash'], data['difficulty'], data['miner'],
+                    data['miner_rewards'], int(data['target'], 16))
+        block.hash = data['hash']
+        block.nonce = data['nonce']
+        block.timestamp = data['timestamp']
+        block.merkle_root = data['merkle_root']
+        block.pruned = data.get('pruned', False)
+        block.transactions = [Transaction.from_dict(tx) for tx in data['transactions']]
+        return block
+
 class BlockChain:
     def __init__(self):
         self.adjust_difficulty_blocks = 10
         self.difficulty = 1
         self.block_time = 3
         self.miner_rewards = 10
-        self.block_limitation = 5
-        self.chain = []
-        self.pending_transactions = []
+        # 區塊容量以 bytes 計算，積壓越多預算越大
+        self.block_size_policy = BlockSizePolicy()
+        self.block_stats = BlockStats()
+        # chain 為 tuple，寫入時整個替換(copy-on-write)，讀取端不需加鎖
+        self.chain = ()
+        self.chain_lock = threading.Lock()
+        self.mempool = Mempool()
+        # 主鏈的索引：區塊 hash -> 高度，交易 key -> 所在區塊 hash
+        self.block_index = {}
+        self.transaction_index = {}
+        # 包含分岔的所有區塊，以累積工作量決定主鏈
+        self.tree = BlockTree()
+        # 低於 pruned_height 的區塊只保留 header，由 ChainPruner 設定
+        self.pruner = None
+        self.pruned_height = 0
+        self.pruned_timestamp = 0
+        # 感測讀值的查詢索引，由 ReadingStore 設定
+        self.reading_store = None
+        # 寫入請求的速率限制，由 AdmissionControl 設定
+        self.admission = None
+        # 已接受交易的 write-ahead log，由 MempoolLog 設定
+        self.mempool_log = None
+        # 礦工私鑰檔，設定後重啟時沿用同一個地址，不必每次重新產生 RSA 金鑰
+        self.miner_key_path = None
+        # 新交易的最低版本；版本 1 沒有簽到時間，任何人都能改時間重送別人的交易
+        self.min_transaction_version = 2
+
+        # 難度以數值門檻表示，由可替換的策略依實際出塊時間調整
+        self.target = target_from_difficulty(self.difficulty)
+        self.difficulty_policy = RetargetPolicy(self.block_time, self.adjust_difficulty_blocks)
 
         self.receive_verified_block = False
-        self.authorized_senders = set()  # 儲存已授權的發送者公鑰
+        # 已授權的發送者：sender id -> (公鑰, 簽章演算法)
+        self.authorized_senders = {}
+        self.signature_schemes = available_schemes()
+        self.network = None  # 多節點時的 PeerNetwork
+        self.metrics = NodeMetrics(self)
+        # 預設不追蹤，由 /tracing 調整抽樣比例
+        self.tracer = Tracer()
+        self.profiler = MiningProfiler()
 
     def create_genesis_block(self):
         print("Create genesis block...")
-        new_block = Block('IoT Final!', self.difficulty, '暖暖豬', self.miner_rewards)
+        new_block = Block('IoT Final!', self.difficulty, '暖暖豬', self.miner_rewards, self.target)
         new_block.hash = self.get_hash(new_block, 0)
-        self.chain.append(new_block)
+        self.append_block(new_block)
+
+    @property
+    def pending_transactions(self):
+        return self.mempool.snapshot()
+
+    def append_block(self, block):
+        """將區塊接到鏈尾，若已不是接在最新區塊之後則回傳 False"""
+        with self.chain_lock:
+            if self.chain and block.previous_hash != self.chain[-1].hash:
+                return False
+            previous = self.chain[-1] if self.chain else None
+            self.tree.add(block)
+            self.index_block(block, len(self.chain))
+            self.chain = self.chain + (block,)
+
+        if previous is not None:
+            self.metrics.block_interval.observe(block.timestamp - previous.timestamp)
+        self.tracer.mark_transactions(block.transactions, 'append')
+        self.tracer.finish_transactions(block.transactions)
+        if self.network is not None:
+            self.network.announce_block(block, self.block_index[block.hash])
+        if self.pruner is not None:
+            self.pruner.after_block(self.block_index[block.hash])
+        return True
+
+    def index_block(self, block, height):
+        self.block_index[block.hash] = height
+        for transaction in block.transactions:
+            self.transaction_index[transaction.key()] = block.hash
+
+    def unindex_block(self, block):
+        self.block_index.pop(block.hash, None)
+        self.unindex_transactions(block)
+
+    def unindex_transactions(self, block):
+        for transaction in block.transactions:
+            if self.transaction_index.get(transaction.key()) == block.hash:
+                del self.transaction_index[transaction.key()]
+
+    def chain_to(self, block_hash):
+        """回傳以 block_hash 為最後一個區塊的鏈(主鏈或分岔)視圖"""
+        chain = self.chain
+        fork_height, branch = self.tree.branch(block_hash, self.block_index, chain)
+        return BranchView(chain, fork_height + 1, branch)
+
+    def reorganize(self, tip_hash):
+        """切換到累積工作量較大的分岔，只更新有變動的區塊索引"""
+        with self.chain_lock:
+            chain = self.chain
+            if self.tree.work[tip_hash] <= self.tree.work[chain[-1].hash]:
+                return False
+            fork_height, branch = self.tree.branch(tip_hash, self.block_index, chain)
+            # 已經修剪過的區塊無法再被換掉
+            if fork_height + 1 < self.pruned_height:
+                return False
+            disconnected = chain[fork_height + 1:]
+            for block in disconnected:
+                self.unindex_block(block)
+            for offset, block in enumerate(branch):
+                self.index_block(block, fork_height + 1 + offset)
+            self.chain = chain[:fork_height + 1] + tuple(branch)
+
+        print(f"[**] Reorganize at height {fork_height}: -{len(disconnected)} +{len(branch)} blocks")
+        for block in branch:
+            self.mempool.remove(block.transactions)
+        # 被換掉的區塊中的交易放回交易池
+        self.return_transactions([tx for block in disconnected for tx in block.transactions])
+        self.receive_verified_block = True
+
+        if self.network is not None:
+            self.network.announce_block(branch[-1], fork_height + len(branch))
+        return True
+
+    def return_transactions(self, transactions):
+        """把沒有被挖出的交易放回交易池，已經上鏈的略過"""
+        self.mempool.restore([tx for tx in transactions if tx.key() not in self.transaction_index])
 
     def initialize_transaction(self, sender, message):
         new_transaction = Transaction(sender, message)
         return new_transaction
 
     def transaction_to_string(self, transaction):
+        if transaction.version == 2:
+            return str({
+                'version': 2,
+                'sender': str(transaction.sender),
+                'message': transaction.message,
+                'timestamp': transaction.timestamp
+            })
+        if transaction.version != 1:
+            raise ValueError(f"Unsupported transaction version {transaction.version}")
         transaction_dict = {
             'sender': str(transaction.sender),
             'message': transaction.message
@@ -98,71 +285,78 @@ class BlockChain:
             transaction_str += self.transaction_to_string(transaction)
         return transaction_str
 
+    def get_merkle_root(self, block):
+        return merkle_root([self.transaction_to_string(tx) for tx in block.transactions])
+
+    def get_block_header(self, block):
+        """雜湊內容中與 nonce 無關的部分，也是交給挖礦行程的工作內容"""
+        return block_header(block.previous_hash, block.timestamp, block.merkle_root, block.target)
+
     def get_hash(self, block, nonce):
-        s = hashlib.sha1()
-        s.update(
-            (
-                block.previous_hash
-                + str(block.timestamp)
-                + self.get_transactions_string(block)
-                + str(nonce)
-            ).encode("utf-8")
-        )
-        h = s.hexdigest()
-        return h
+        return header_hash(self.get_block_header(block), nonce)
 
     def add_transaction_to_block(self, block):
-        if len(self.pending_transactions) > self.block_limitation:
-            transaction_accepted = self.pending_transactions[:self.block_limitation]
-            self.pending_transactions = self.pending_transactions[self.block_limitation:]
-        else:
-            transaction_accepted = self.pending_transactions
-            self.pending_transactions = []
+        transaction_accepted, used_bytes, budget, backlog_bytes = \
+            self.mempool.take(self.block_size_policy.select)
         block.transactions = transaction_accepted
+        self.tracer.mark_transactions(transaction_accepted, 'mempool_wait')
+        block.merkle_root = self.get_merkle_root(block)
+        self.tracer.mark_transactions(transaction_accepted, 'assemble')
+        self.block_stats.record(used_bytes, budget, len(transaction_accepted),
+                                len(self.mempool), backlog_bytes)
 
-    def mine_block(self, miner):
-        start = time.process_time()
-
-        last_block = self.chain[-1]
-        new_block = Block(last_block.hash, self.difficulty, miner, self.miner_rewards)
+    def create_block_template(self, miner):
+        """組裝下一個待挖的區塊(尚未找到 nonce)"""
+        chain = self.chain
+        last_block = chain[-1]
+        # 門檻依照實際接上的鏈計算，避免收到其他節點的區塊後沿用舊值
+        self.target = self.difficulty_policy.next_target(chain)
+        self.difficulty = difficulty_from_target(self.target)
+        new_block = Block(last_block.hash, self.difficulty, miner, self.miner_rewards, self.target)
+        # 本機時鐘落後時仍要產生其他節點會接受的時間
+        new_block.timestamp = max(new_block.timestamp, median_time_past(chain))
+        # 等太久的交易放進區塊會被其他節點拒絕
+        self.mempool.expire(new_block.timestamp - TRANSACTION_MAX_AGE)
 
         self.add_transaction_to_block(new_block)
         new_block.previous_hash = last_block.hash
-        new_block.difficulty = self.difficulty
+        return new_block
+
+    def mine_block(self, miner):
+        start = time.process_time()
+
+        new_block = self.create_block_template(miner)
+        new_block.nonce = first_nonce = random.getrandbits(32)
         new_block.hash = self.get_hash(new_block, new_block.nonce)
-        new_block.nonce = random.getrandbits(32)
 
-        while new_block.hash[0: self.difficulty] != '0' * self.difficulty:
+        while not check_proof_of_work(new_block.hash, new_block.target):
             new_block.nonce += 1
             new_block.hash = self.get_hash(new_block, new_block.nonce)
             if self.receive_verified_block:
+                self.metrics.hashes.inc(new_block.nonce - first_nonce + 1)
                 print(f"[**] Verified received block. Mine next!")
                 self.receive_verified_block = False
+                self.return_transactions(new_block.transactions)
                 return False
 
+        self.metrics.hashes.inc(new_block.nonce - first_nonce + 1)
+        self.tracer.mark_transactions(new_block.transactions, 'pow')
         time_consumed = round(time.process_time() - start, 5)
         print(f"Hash: {new_block.hash} @ diff {self.difficulty}; {time_consumed}s")
-        self.chain.append(new_block)
+        if not self.append_block(new_block):
+            self.return_transactions(new_block.transactions)
+            return False
 
     def adjust_difficulty(self):
-        if len(self.chain) % self.adjust_difficulty_blocks != 1:
-            return self.difficulty
-        elif len(self.chain) <= self.adjust_difficulty_blocks:
-            return self.difficulty
-        else:
-            start = self.chain[-1*self.adjust_difficulty_blocks-1].timestamp
-            finish = self.chain[-1].timestamp
-            average_time_consumed = round((finish - start) / (self.adjust_difficulty_blocks), 2)
-            # if average_time_consumed > self.block_time:
-            if self.difficulty == 6:
-                # print(f"Average block time:{average_time_consumed}s. Lower the difficulty")
-                # self.difficulty -= 1
-                print(f"Average block time:{average_time_consumed}s.")
-                self.difficulty += 0
-            else:
-                # print(f"Average block time:{average_time_consumed}s. High up the difficulty")
-                print(f"Average block time:{average_time_consumed}s.")
-                self.difficulty += 1
+        """依照難度策略計算下一個區塊的門檻"""
+        if self.difficulty_policy.is_epoch_boundary(self.chain):
+            average_time_consumed = round(self.difficulty_policy.average_block_time(
+                self.chain, self.adjust_difficulty_blocks), 2)
+            print(f"Average block time:{average_time_consumed}s.")
+
+        self.target = self.difficulty_policy.next_target(self.chain)
+        self.difficulty = difficulty_from_target(self.target)
+        return self.difficulty
 
     def get_balance(self, account):
         return 999999
@@ -170,7 +364,10 @@ class BlockChain:
     def verify_blockchain(self):
         previous_hash = ''
         for idx,block in enumerate(self.chain):
-            if self.get_hash(block, block.nonce) != block.hash:
+            if not block.pruned and self.get_merkle_root(block) != block.merkle_root:
+                print("Error:Merkle root not matched!")
+                return False
+            elif self.get_hash(block, block.nonce) != block.hash:
                 print("Error:Hash not matched!")
                 return False
             elif previous_hash != block.previous_hash and idx:
@@ -180,50 +377,240 @@ class BlockChain:
         print("Hash correct!")
         return True
 
-    def add_transaction(self, transaction, signature):
+    def verify_block(self, block, chain):
+        """驗證接在 chain 之後的區塊：連結、雜湊、門檻、工作量與交易簽名"""
+        if block.previous_hash != chain[-1].hash:
+            return False, "Hash not matched to previous_hash"
+        if self.get_merkle_root(block) != block.merkle_root:
+            return False, "Merkle root not matched"
+        if self.get_hash(block, block.nonce) != block.hash:
+            return False, "Hash not matched"
+        error = check_timestamp(block.timestamp, chain)
+        if error is not None:
+            return False, error
+        if block.target != self.difficulty_policy.next_target(chain):
+            return False, "Unexpected difficulty target"
+        if not check_proof_of_work(block.hash, block.target):
+            return False, "Insufficient proof of work"
+        batches = {}
+        keys = set()
+        for transaction in block.transactions:
+            key = transaction.key()
+            # 同一筆交易在區塊內出現兩次，讀值會被查詢與匯出重複計算
+            if key in keys:
+                return False, "Duplicate transaction in block"
+            keys.add(key)
+            if self.transaction_in_chain(key, chain):
+                return False, "Transaction already in chain"
+            if not block.timestamp - TRANSACTION_MAX_AGE <= transaction.timestamp \
+                    <= block.timestamp + TRANSACTION_MAX_FUTURE:
+                return False, "Transaction timestamp out of range"
+            try:
+                public_key, scheme = self.resolve_sender(transaction.sender)
+                batches.setdefault(scheme, []).append((
+                    public_key,
+                    self.transaction_to_string(transaction).encode('utf-8'),
+                    base64.b64decode(transaction.signature)))
+            except Exception as e:
+                return False, f"Signature verification failed: {str(e)}"
+        # 同一演算法的簽章一起驗證
+        for scheme, items in batches.items():
+            if scheme not in self.signature_schemes:
+                return False, f"Unsupported signature scheme {scheme}"
+            if self.signature_schemes[scheme].verify_batch(items) is not None:
+                return False, "Signature verification failed"
+        return True, "Block verified"
+
+    def transaction_in_chain(self, key, chain):
+        """交易是否已經在 chain(主鏈或分岔視圖)之中"""
+        if key in getattr(chain, 'transaction_keys', ()):
+            return True
+        block_hash = self.transaction_index.get(key)
+        if block_hash is None:
+            return False
+        height = self.block_index.get(block_hash)
+        return height is not None and height < len(chain) and chain[height].hash == block_hash
+
+    def receive_block(self, data):
+        """驗證其他節點挖出的區塊，接到鏈尾或放進分岔，必要時切換主鏈"""
+        new_block = Block.from_dict(data)
+        if new_block.hash in self.tree:
+            return False, "Known block"
+        if new_block.previous_hash not in self.tree:
+            return False, "Unknown previous block"
+
+        result, message = self.verify_block(new_block, self.chain_to(new_block.previous_hash))
+        if not result:
+            return False, message
+
+        if new_block.previous_hash == self.chain[-1].hash and self.append_block(new_block):
+            self.mempool.remove(new_block.transactions)
+            # 通知挖礦迴圈放棄目前的區塊
+            self.receive_verified_block = True
+            return True, "Block accepted"
+
+        self.tree.add(new_block)
+        if self.reorganize(new_block.hash):
+            return True, "Chain reorganized"
+        return True, "Block stored in side branch"
+
+    def receive_genesis_block(self, data):
+        """沒有建立創世區塊的節點採用其他節點的創世區塊"""
+        new_block = Block.from_dict(data)
+        if self.chain or self.get_hash(new_block, new_block.nonce) != new_block.hash:
+            return False
+        return self.append_block(new_block)
+
+    def load_chain(self, blocks, pruned_height=0, pruned_timestamp=0):
+        """以 snapshot 中的區塊建立鏈，header 的雜湊與連結需事先檢查過"""
+        new_blocks = [Block.from_dict(data) for data in blocks]
+        genesis = new_blocks[0]
+        if self.get_hash(genesis, genesis.nonce) != genesis.hash:
+            raise ValueError("Invalid genesis block")
+        for block in new_blocks:
+            if not block.pruned and self.get_merkle_root(block) != block.merkle_root:
+                raise ValueError(f"Merkle root not matched in block {block.hash}")
+
+        with self.chain_lock:
+            if self.chain:
+                raise ValueError("Snapshot can only be loaded into an empty chain")
+            for height, block in enumerate(new_blocks):
+                self.tree.add(block)
+                self.index_block(block, height)
+            self.chain = tuple(new_blocks)
+            self.pruned_height = pruned_height
+            self.pruned_timestamp = pruned_timestamp
+
+    def load_pending(self, transactions):
+        """把 mempool log 中的交易字典放回交易池，已上鏈或太舊的略過
+
+        回傳 (放回的筆數, 發送者未登記的交易字典)；這些交易挖進區塊後會被其他節點拒絕，
+        因此不放回交易池，由呼叫者保留。
+        """
+        pending, unknown = [], []
+        for data in transactions:
+            tx = Transaction.from_dict(data)
+            if tx.key() in self.transaction_index or tx.timestamp < self.pruned_timestamp:
+                continue
+            if self.find_sender(tx.sender) is None:
+                unknown.append(data)
+            else:
+                pending.append(tx)
+        self.mempool.restore(pending)
+        return len(pending), unknown
+
+    def find_sender(self, sender):
+        """交易的 sender 可以是 sender id 或完整公鑰(舊版客戶端)，回傳登記的 (公鑰, 演算法)"""
+        entry = self.authorized_senders.get(sender)
+        if entry is None:
+            entry = self.authorized_senders.get(sender_id(sender))
+            if entry is not None and entry[0] != sender:
+                entry = None
+        return entry
+
+    def resolve_sender(self, sender):
+        """同 find_sender，未登記的完整公鑰依長度判斷演算法，未知的 sender id 拋出例外"""
+        entry = self.find_sender(sender)
+        if entry is not None:
+            return entry
+        if len(sender) == len(sender_id(sender)):
+            raise ValueError("Unknown sender id")
+        return sender, detect_scheme(sender)
+
+    def verify_signature(self, transaction, signature):
+        """依發送者登記的演算法驗證交易簽名，失敗時拋出例外"""
+        public_key, scheme = self.resolve_sender(transaction.sender)
+        transaction_str = self.transaction_to_string(transaction)
+        self.signature_schemes[scheme].verify(public_key, transaction_str.encode('utf-8'), signature)
+
+    def add_transaction(self, transaction, signature, trace=NULL_TRACE):
         """驗證並添加交易"""
         # 檢查發送者是否已授權
-        if transaction.sender not in self.authorized_senders:
+        if self.find_sender(transaction.sender) is None:
             return False, "Sender not authorized!"
 
-        # 驗證簽名
-        public_key = '-----BEGIN RSA PUBLIC KEY-----\n'
-        public_key += transaction.sender
-        public_key += '\n-----END RSA PUBLIC KEY-----\n'
-        public_key_pkcs = rsa.PublicKey.load_pkcs1(public_key.encode('utf-8'))
-        
-        # 生成交易字符串（包含時間戳以防重放攻擊）
-        transaction_str = self.transaction_to_string(transaction)
-        
+        if not isinstance(transaction.timestamp, (int, float)):
+            return False, "Invalid transaction timestamp"
+        if transaction.version < self.min_transaction_version:
+            return False, f"Transaction version {self.min_transaction_version} or later required"
+        # 修剪範圍內的交易已無法檢查是否重複
+        if transaction.timestamp < self.pruned_timestamp:
+            return False, "Transaction too old!"
+        # 時間會寫入查詢索引與匯出檔，不接受偏離節點時鐘太多的時間
+        now = time.time()
+        if not now - TRANSACTION_MAX_AGE <= transaction.timestamp <= now + TRANSACTION_MAX_FUTURE:
+            return False, "Transaction timestamp out of range"
+
         try:
             # 驗證簽名
-            rsa.verify(transaction_str.encode('utf-8'), signature, public_key_pkcs)
-            
-            # 檢查是否是重複交易
-            for pending_tx in self.pending_transactions:
-                if (pending_tx.sender == transaction.sender and 
-                    pending_tx.message == transaction.message and 
-                    abs(pending_tx.timestamp - transaction.timestamp) < 300):  # 5分鐘內的相同交易視為重複
-                    return False, "Duplicate transaction!"
-            
-            self.pending_transactions.append(transaction)
+            start = time.perf_counter()
+            self.verify_signature(transaction, signature)
+            self.metrics.signature_seconds.observe(time.perf_counter() - start)
+            trace.mark('verify')
+            transaction.signature = base64.b64encode(signature).decode('utf-8')
+
+            if transaction.key() in self.transaction_index:
+                self.metrics.duplicates.inc()
+                return False, "Duplicate transaction!"
+            trace.mark('duplicate_check')
+
+            # 檢查是否是重複交易(5分鐘內的相同交易視為重複)
+            if trace is not NULL_TRACE:
+                transaction.trace = trace
+            if not self.mempool.add(transaction):
+                transaction.trace = None
+                self.metrics.duplicates.inc()
+                return False, "Duplicate transaction!"
+            trace.mark('mempool_insert')
+
+            # 回應成功前先寫入 log，當掉重啟後仍能放回交易池
+            if self.mempool_log is not None:
+                try:
+                    self.mempool_log.append(transaction)
+                except OSError as e:
+                    self.mempool.remove([transaction])
+                    return False, f"Cannot persist transaction: {str(e)}"
+                trace.mark('log_fsync')
+
+            if self.network is not None:
+                self.network.announce_transaction(transaction)
             return True, "Transaction authorized successfully!"
         except Exception as e:
-            return False, f"RSA Verification failed: {str(e)}"
+            return False, f"Signature verification failed: {str(e)}"
 
     def mining(self):
         address, private = self.generate_address()
+        miner = sender_id(address)
         print(f"Miner address: {address}")
+        print(f"Miner id: {miner}")
         print(f"Miner private: {private}")
 
+        # 還沒從其他節點同步到創世區塊前先等待
+        while not self.chain:
+            time.sleep(1)
+
+        self.profiler.attach()
         while(True):
-            self.mine_block(address)
+            self.profiler.checkpoint()
+            self.mine_block(miner)
             self.adjust_difficulty()
+            # 兩輪之間區塊模板的交易已上鏈或退回交易池，可以安全重寫 log
+            if self.mempool_log is not None:
+                self.mempool_log.compact()
 
-    def start(self):
-        if len(sys.argv) < 3:
+    def start(self, miners=0):
+        if not self.chain and (self.network is None or not self.network.peers):
             self.create_genesis_block()
+        elif self.network is not None:
+            # 不建立創世區塊，改從其他節點同步
+            self.network.connect()
+        # 鏈載入後再重播，已上鏈的交易不會放回交易池
+        if self.mempool_log is not None:
+            self.mempool_log.replay()
 
+        if miners:
+            ProcessMiner(self, miners).start()
+            return
         thread = threading.Thread(target=self.mining)
         thread.start()
 
@@ -244,7 +631,9 @@ class BlockChain:
 
     def request_chain(self):
         """修改這個方法來返回可序列化的數據"""
-        clean_chain = [block.to_dict() for block in self.chain]
+        chain = self.chain  # 取得當下的快照，挖礦執行緒之後的寫入不影響
+        # 交易簽章只在節點之間的區塊傳輸中提供
+        clean_chain = [block.to_dict(signatures=False) for block in chain]
         
         response = {
             "chain": clean_chain
@@ -252,28 +641,166 @@ class BlockChain:
 
         return response
     
-    # def request_transaction(self, data):
-    #     try:
-    #         new_transaction = Transaction.from_dict(data["data"])
+    def request_transaction(self, data, trace=NULL_TRACE, remote_addr=None):
+        """處理 /transaction 的請求內容，供 Flask 與 ASGI 共用"""
+        try:
+            # 從請求中獲取交易數據
+            transaction_data = data.get("data")
+            signature = data.get("signature")
+
+            if not transaction_data or not signature:
+                return {
+                    "success": False,
+                    "message": "Missing transaction data or signature"
+                }
+
+            # 創建交易對象
+            new_transaction = Transaction.from_dict(transaction_data)
+            trace.mark('from_dict')
 
-    #         result, result_message = self.add_transaction(
-    #             new_transaction,
-    #             base64.b64decode(data["signature"].encode("utf-8"))
-    #         )
+            admission = self.admission
+            if admission is not None:
+                rejection = admission.admit_transaction(new_transaction.sender, remote_addr)
+                if rejection is not None:
+                    return rejection
 
-    #         response = {
-    #             "data": result,
-    #             "message": result_message
-    #         }
+            success = False
+            try:
+                # 解碼簽名
+                decoded_signature = base64.b64decode(signature.encode("utf-8"))
+                trace.mark('base64_decode')
+
+                # 添加交易並獲取結果
+                success, message = self.add_transaction(new_transaction, decoded_signature, trace)
+            finally:
+                # 包含簽章格式錯誤拋出例外的情況，偽造的請求不能耗掉發送者的額度
+                if not success and admission is not None:
+                    admission.refund_sender(new_transaction.sender)
+            if not success:
+                self.tracer.finish(trace)
+
+            return {
+                "success": success,
+                "message": message
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error processing transaction: {str(e)}"
+            }
+
+    def request_traces(self, recent=20):
+        """處理 /traces：抽樣追蹤的統計與最近 recent 筆追蹤"""
+        try:
+            recent = int(recent)
+        except (TypeError, ValueError):
+            return {
+                "success": False,
+                "message": "recent must be an integer"
+            }
+        return self.tracer.summary(max(0, recent))
+
+    def request_tracing(self, data):
+        """調整追蹤抽樣比例，0 為關閉"""
+        try:
+            sample_rate = float(data.get('sample_rate', 0))
+        except (AttributeError, TypeError, ValueError):
+            return {
+                "success": False,
+                "message": "sample_rate must be a number between 0 and 1"
+            }
+        # NaN 視為 0
+        self.tracer.sample_rate = min(1.0, max(0.0, sample_rate))
+        return {
+            "success": True,
+            "sample_rate": self.tracer.sample_rate
+        }
+
+    def request_profile(self, data):
+        """開始或停止挖礦執行緒的效能分析，mode 為 sample 或 cprofile"""
+        action = data.get('action') if isinstance(data, dict) else None
+        if action == 'start':
+            try:
+                success = self.profiler.start(data.get('mode', 'sample'))
+            except ValueError as e:
+                return {
+                    "success": False,
+                    "message": str(e)
+                }
+        elif action == 'stop':
+            success = self.profiler.stop()
+        else:
+            return {
+                "success": False,
+                "message": "action must be start or stop"
+            }
+        return {
+            "success": success,
+            **self.profiler.status()
+        }
+
+    def request_query(self, data):
+        """處理 /query 的請求內容，參數格式見 query.py"""
+        if self.reading_store is None:
+            return {
+                "success": False,
+                "message": "Query store is not enabled"
+            }
+        try:
+            prepared = self.reading_store.build_query(data)
+        except (ValueError, TypeError, AttributeError, KeyError, OverflowError) as e:
+            # 查詢內容由客戶端任意填寫，格式錯誤時回傳說明而不是 500
+            return {
+                "success": False,
+                "message": f"Invalid query: {str(e)}"
+            }
+        try:
+            return {
+                "success": True,
+                **self.reading_store.query(data, prepared)
+            }
+        except (sqlite3.Error, OSError) as e:
+            # 索引同步或資料庫本身的問題，不是查詢內容的錯誤
+            print(f"Query store failed: {e}")
+            return {
+                "success": False,
+                "message": f"Query store error: {str(e)}"
+            }
+
+    def request_register_sender(self, data):
+        """處理 /register_sender 的請求內容"""
+        try:
+            public_key = data.get('public_key')
+            if not public_key:
+                return {
+                    "success": False,
+                    "message": "Public key is required"
+                }
+
+            success = self.add_authorized_sender(public_key, data.get('scheme', 'rsa'))
+            return {
+                "success": success,
+                "message": "Sender registered successfully" if success else "Registration failed",
+                "sender_id": sender_id(public_key)
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            }
 
-    #         return response
-    #     except Exception as e:
-    #         print("Cannot Add Transaction!")
-    #         print(e)
-    #         return { "message": "error" }
-        
     def generate_address(self):
-        public, private = rsa.newkeys(512)
+        if self.miner_key_path and os.path.exists(self.miner_key_path):
+            with open(self.miner_key_path, 'rb') as f:
+                private = rsa.PrivateKey.load_pkcs1(f.read())
+            public = rsa.PublicKey(private.n, private.e)
+        else:
+            public, private = rsa.newkeys(512)
+            if self.miner_key_path:
+                fd = os.open(self.miner_key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(private.save_pkcs1())
         public_key = public.save_pkcs1()
         private_key = private.save_pkcs1()
         return self.get_address_from_public(public_key), \
@@ -291,11 +818,72 @@ class BlockChain:
         private_key = private_key.replace("-----END RSA PRIVATE KEY-----'", '')
         return private_key
 
-    def add_authorized_sender(self, public_key):
-        """添加授權的發送者"""
-        self.authorized_senders.add(public_key)
+    def add_authorized_sender(self, public_key, scheme='rsa'):
+        """添加授權的發送者，並記錄其簽章演算法"""
+        if scheme not in self.signature_schemes:
+            return False
+        key = sender_id(public_key)
+        known = self.authorized_senders.get(key)
+        if known != (public_key, scheme) and self.mempool_log is not None:
+            # 登記沒有寫入 log 就不回報成功，重啟後才認得這個發送者的交易
+            self.mempool_log.append_sender(public_key, scheme)
+        if known is None and self.network is not None:
+            self.network.announce_sender(public_key, scheme)
+        self.authorized_senders[key] = (public_key, scheme)
         return True
 
+    def load_senders(self, senders):
+        """載入 [公鑰, 演算法] 列表(來自 snapshot 或其他節點)，不再廣播"""
+        for public_key, scheme in senders:
+            if scheme in self.signature_schemes:
+                self.authorized_senders[sender_id(public_key)] = (public_key, scheme)
+
+    def request_senders(self):
+        return {
+            "senders": sorted(self.authorized_senders.values())
+        }
+
+def read_request():
+    """解碼請求內容，支援 JSON / MessagePack 與 gzip / zstd 壓縮"""
+    return decode_body(request.get_data(), request.content_type,
+                       request.headers.get('Content-Encoding'))
+
+def respond(data):
+    """依 Accept / Accept-Encoding 選擇回應格式與壓縮方式，被限流的請求回傳 429"""
+    body, content_type, encoding = encode_response(
+        data, request.headers.get('Accept'), request.headers.get('Accept-Encoding'))
+    response = Response(body, mimetype=content_type)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if 'retry_after' in data:
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(data['retry_after']))
+    return response
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.before_request
+def admit():
+    if block.admission is None:
+        return None
+    rejection, g.admitted = block.admission.admit_request(request.path, request.remote_addr)
+    if rejection is not None:
+        return respond(rejection)
+
+@app.teardown_request
+def release(exception):
+    if g.pop('admitted', False):
+        block.admission.release()
+
+@app.after_request
+def record_latency(response):
+    route = request.url_rule.rule if request.url_rule else 'other'
+    block.metrics.request_seconds.observe(time.perf_counter() - g.start_time, route)
+    return response
+
 @app.route('/')
 def hello_world():
     return 'Hello World'
@@ -311,69 +899,170 @@ def hello_world():
 @app.route('/transaction', methods=['POST'])
 def transaction():
     if request.method == 'POST':
+        trace = block.tracer.start('transaction')
         try:
-            req = request.get_json()
-            # 從請求中獲取交易數據
-            transaction_data = req.get("data")
-            signature = req.get("signature")
-            
-            if not transaction_data or not signature:
-                return {
-                    "success": False,
-                    "message": "Missing transaction data or signature"
-                }
-            
-            # 創建交易對象
-            new_transaction = Transaction.from_dict(transaction_data)
-            
-            # 解碼簽名
-            decoded_signature = base64.b64decode(signature.encode("utf-8"))
-            
-            # 添加交易並獲取結果
-            success, message = block.add_transaction(new_transaction, decoded_signature)
-            
-            return {
-                "success": success,
-                "message": message
-            }
-            
+            req = read_request()
         except Exception as e:
-            return {
+            return respond({
                 "success": False,
                 "message": f"Error processing transaction: {str(e)}"
-            }
+            })
+        trace.mark('parse_json')
+        return respond(block.request_transaction(req, trace, request.remote_addr))
 
 @app.route('/get_chain', methods=['GET'])
 def get_chain():
     if request.method == 'GET':
+        start = time.perf_counter()
+        trace = block.tracer.start('get_chain')
         res = block.request_chain()
-        return json.dumps(res)  # 確保返回的是 JSON 字符串
+        trace.mark('request_chain')
+        res = respond(res)
+        trace.mark('serialize')
+        block.tracer.finish(trace)
+        block.metrics.observe_chain_response(res.content_length, time.perf_counter() - start)
+        return res
+
+@app.route('/block_stats', methods=['GET'])
+def block_stats():
+    if request.method == 'GET':
+        return block.block_stats.to_dict()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if request.method == 'GET':
+        return Response(block.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces', methods=['GET'])
+def traces():
+    if request.method == 'GET':
+        return respond(block.request_traces(request.args.get('recent', 20)))
+
+@app.route('/tracing', methods=['POST'])
+def tracing():
+    if request.method == 'POST':
+        try:
+            req = read_request()
+        except Exception as e:
+            return respond({
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return respond(block.request_tracing(req))
+
+@app.route('/profile', methods=['GET', 'POST'])
+def profile():
+    if request.method == 'POST':
+        try:
+            req = read_request()
+        except Exception as e:
+            return respond({
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return respond(block.request_profile(req))
+    # folded stacks，可直接交給 flamegraph.pl 或 speedscope
+    return Response(block.profiler.folded(), mimetype='text/plain')
+
+@app.route('/query', methods=['POST'])
+def query():
+    if request.method == 'POST':
+        try:
+            req = read_request()
+        except Exception as e:
+            return respond({
+                "success": False,
+                "message": f"Error: {str(e)}"
+            })
+        return respond(block.request_query(req))
+
+@app.route('/get_block', methods=['GET'])
+def get_block():
+    if request.method == 'GET':
+        return block.network.request_block(request.args.get('hash'))
+
+@app.route('/get_headers', methods=['GET'])
+def get_headers():
+    if request.method == 'GET':
+        return respond(block.network.request_headers(request.args.get('start', 0, type=int),
+                                                     request.args.get('count', 0, type=int)))
+
+@app.route('/get_blocks', methods=['POST'])
+def get_blocks():
+    if request.method == 'POST':
+        return respond(block.network.request_blocks(read_request()))
+
+@app.route('/sync_status', methods=['GET'])
+def sync_status():
+    if request.method == 'GET':
+        return block.network.synchronizer.status()
+
+@app.route('/announce_block', methods=['POST'])
+def announce_block():
+    if request.method == 'POST':
+        return block.network.request_announce_block(request.get_json(), request.remote_addr)
+
+@app.route('/add_peer', methods=['POST'])
+def add_peer():
+    if request.method == 'POST':
+        return block.network.request_add_peer(request.get_json(), request.remote_addr)
+
+@app.route('/snapshot', methods=['GET'])
+def snapshot():
+    if request.method == 'GET':
+        return Response(snapshot_bytes(block), mimetype='application/gzip')
+
+@app.route('/senders', methods=['GET'])
+def senders():
+    if request.method == 'GET':
+        return respond(block.request_senders())
 
 @app.route('/register_sender', methods=['POST'])
 def register_sender():
     if request.method == 'POST':
         try:
-            data = request.get_json()
-            public_key = data.get('public_key')
-            if not public_key:
-                return {
-                    "success": False,
-                    "message": "Public key is required"
-                }
-            
-            success = block.add_authorized_sender(public_key)
-            return {
-                "success": success,
-                "message": "Sender registered successfully" if success else "Registration failed"
-            }
+            data = read_request()
         except Exception as e:
-            return {
+            return respond({
                 "success": False,
                 "message": f"Error: {str(e)}"
-            }
+            })
+        return respond(block.request_register_sender(data))
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the blockchain node with Flask")
+    parser.add_argument("legacy", nargs="*", metavar="ARG",
+                        help="[port] [peer_url ...] [snapshot.json.gz], same as --port/--peers/--snapshot")
+    add_arguments(parser)
+    args = parser.parse_args()
+    # 保留原本 python server.py [port] [peer_url ...] [snapshot.json.gz] 的用法
+    legacy = {}
+    if args.legacy and args.legacy[0].isdigit():
+        legacy['port'] = int(args.legacy.pop(0))
+    if any(arg.startswith('http') for arg in args.legacy):
+        legacy['peers'] = [arg for arg in args.legacy if arg.startswith('http')]
+    snapshots = [arg for arg in args.legacy if not arg.startswith('http')]
+    if snapshots:
+        legacy['snapshot'] = snapshots[0]
+    config = NodeConfig.from_args(args, legacy)
+
+    port = config['port']
     block = BlockChain()
-    block.start()
+    block.miner_key_path = f"miner-{port}.pem" if config['miner_key'] is None else config['miner_key']
+    PeerNetwork(block, port, config['peers'])
+    if config['prune_horizon']:
+        ChainPruner(block, config['prune_horizon'], archive_dir=config['archive_dir'])
+    if config['snapshot']:
+        load_snapshot(block, config['snapshot'], config['checkpoint'])
+    wal = f"mempool-{port}.wal" if config['wal'] is None else config['wal']
+    if wal:
+        MempoolLog(block, wal)
+    ReadingStore(block, config['query_db']).start()
+    AdmissionControl(block)
+    config.apply(block)
+    config.watch(block)
+    if config['export_dir']:
+        ColumnarExporter(config['export_dir']).start(block)
+    block.start(config['miners'])
 
-    app.run(host='0.0.0.0', port=8000, debug=False)
+    app.run(host=config['host'], port=port, debug=False)
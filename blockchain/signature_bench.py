@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from signatures import RSAScheme, available_schemes
+
+
+def rate(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return count / (time.perf_counter() - start)
+
+
+def bench(scheme, count, batch_size):
+    sender, private_key = scheme.generate()
+    messages = [str({"sender": sender, "message": str({"temperature": 25.0, "seq": i})}).encode('utf-8')
+                for i in range(batch_size)]
+    signatures = [scheme.sign(private_key, message) for message in messages]
+    items = [(sender, message, signature) for message, signature in zip(messages, signatures)]
+
+    keygen = rate(scheme.generate, max(1, count // 50))
+    sign = rate(lambda: scheme.sign(private_key, messages[0]), count)
+    verify = rate(lambda: scheme.verify(sender, messages[0], signatures[0]), count)
+    batches = max(1, count // batch_size)
+    assert scheme.verify_batch(items) is None
+    batch = rate(lambda: scheme.verify_batch(items), batches) * batch_size
+    return keygen, sign, verify, batch, len(sender), len(signatures[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare signature schemes supported by the node")
+    parser.add_argument("--count", type=int, default=2000, help="operations per measurement")
+    parser.add_argument("--batch", type=int, default=100, help="signatures per verify_batch call")
+    args = parser.parse_args()
+
+    print(f"{'scheme':<20}{'keygen/s':>10}{'sign/s':>10}{'verify/s':>10}{'batch/s':>10}"
+          f"{'key':>6}{'sig':>6}")
+    schemes = available_schemes()
+    for name, scheme in schemes.items():
+        keygen, sign, verify, batch, key_size, signature_size = bench(scheme, args.count, args.batch)
+        print(f"{name:<20}{keygen:>10.0f}{sign:>10.0f}{verify:>10.0f}{batch:>10.0f}"
+              f"{key_size:>6}{signature_size:>6}")
+
+    # 加入快取之前，每次驗證都要重新解析 RSA 公鑰
+    uncached = RSAScheme()
+    sender, private_key = uncached.generate()
+    message = b'reading'
+    signature = uncached.sign(private_key, message)
+
+    def verify_uncached():
+        uncached.keys.clear()
+        uncached.verify(sender, message, signature)
+    print(f"{'rsa (no key cache)':<20}{'':>10}{'':>10}{rate(verify_uncached, args.count):>10.0f}")
+    if 'ed25519' not in schemes:
+        print("Ed25519 unavailable: install the cryptography package")
+
+
+if __name__ == '__main__':
+    main()
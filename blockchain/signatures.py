@@ -0,0 +1,121 @@
+import base64
+import hashlib
+from importlib.util import find_spec
+
+import rsa
+
+# cryptography 在第一次遇到 Ed25519 發送者時才載入；沒有安裝時只支援 RSA
+HAS_CRYPTOGRAPHY = find_spec('cryptography') is not None
+
+
+class SignatureScheme:
+    """簽章演算法介面，sender 為公鑰的字串表示"""
+
+    name = None
+
+    def verify(self, sender, data, signature):
+        """驗證失敗時拋出例外"""
+        raise NotImplementedError
+
+    def verify_batch(self, items):
+        """items 為 (sender, data, signature)，回傳第一筆驗證失敗的索引，全部通過時回傳 None"""
+        for idx, (sender, data, signature) in enumerate(items):
+            try:
+                self.verify(sender, data, signature)
+            except Exception:
+                return idx
+        return None
+
+
+class RSAScheme(SignatureScheme):
+    """原本的 512-bit RSA / SHA-1 (純 Python 的 rsa 套件)，保留相容性"""
+
+    name = 'rsa'
+
+    def __init__(self):
+        # 解析 PKCS#1 公鑰比驗證本身還慢，同一個發送者只解析一次
+        self.keys = {}
+
+    def public_key(self, sender):
+        key = self.keys.get(sender)
+        if key is None:
+            pem = '-----BEGIN RSA PUBLIC KEY-----\n' + sender + '\n-----END RSA PUBLIC KEY-----\n'
+            key = self.keys[sender] = rsa.PublicKey.load_pkcs1(pem.encode('utf-8'))
+        return key
+
+    def verify(self, sender, data, signature):
+        rsa.verify(data, signature, self.public_key(sender))
+
+    @staticmethod
+    def generate():
+        public_key, private_key = rsa.newkeys(512)
+        sender = str(public_key.save_pkcs1()).replace('\\n', '')
+        sender = sender.replace("b'-----BEGIN RSA PUBLIC KEY-----", '')
+        sender = sender.replace("-----END RSA PUBLIC KEY-----'", '')
+        return sender, private_key
+
+    @staticmethod
+    def sign(private_key, data):
+        return rsa.sign(data, private_key, 'SHA-1')
+
+
+class Ed25519Scheme(SignatureScheme):
+    """Ed25519：32 bytes 公鑰、64 bytes 簽章，驗證由 OpenSSL 執行"""
+
+    name = 'ed25519'
+
+    def __init__(self):
+        if not HAS_CRYPTOGRAPHY:
+            raise RuntimeError("Ed25519 requires the cryptography package")
+        self.keys = {}
+
+    def public_key(self, sender):
+        key = self.keys.get(sender)
+        if key is None:
+            from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+            key = self.keys[sender] = Ed25519PublicKey.from_public_bytes(base64.b64decode(sender))
+        return key
+
+    def verify(self, sender, data, signature):
+        from cryptography.exceptions import InvalidSignature
+
+        try:
+            self.public_key(sender).verify(signature, data)
+        except InvalidSignature:
+            raise ValueError("Verification failed") from None
+
+    @staticmethod
+    def generate():
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+        private_key = Ed25519PrivateKey.generate()
+        public_bytes = private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        return base64.b64encode(public_bytes).decode('ascii'), private_key
+
+    @staticmethod
+    def sign(private_key, data):
+        return private_key.sign(data)
+
+
+def sender_id(public_key):
+    """交易中以公鑰雜湊取代完整公鑰，固定 40 個十六進位字元"""
+    return hashlib.sha256(public_key.encode('utf-8')).hexdigest()[:40]
+
+
+def available_schemes():
+    schemes = {RSAScheme.name: RSAScheme()}
+    if HAS_CRYPTOGRAPHY:
+        schemes[Ed25519Scheme.name] = Ed25519Scheme()
+    return schemes
+
+
+def detect_scheme(sender):
+    """未登記的發送者(例如其他節點區塊中的交易)依公鑰長度判斷演算法"""
+    try:
+        if len(base64.b64decode(sender, validate=True)) == 32:
+            return Ed25519Scheme.name
+    except ValueError:
+        pass
+    return RSAScheme.name
@@ -0,0 +1,95 @@
+import gzip
+import json
+import sys
+
+from hashing import block_header, check_headers, header_hash
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_bytes(blockchain):
+    """將主鏈(已修剪的區塊只有 header)與授權發送者打包成 gzip JSON"""
+    chain = blockchain.chain
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "height": len(chain),
+        "tip": chain[-1].hash,
+        "pruned_height": blockchain.pruned_height,
+        "pruned_timestamp": blockchain.pruned_timestamp,
+        "authorized_senders": sorted(blockchain.authorized_senders.values()),
+        "blocks": [block.to_dict() for block in chain]
+    }
+    return gzip.compress(json.dumps(data).encode('utf-8'))
+
+
+def export_snapshot(blockchain, path):
+    """匯出 snapshot，回傳可作為 checkpoint 的 (高度, 最新區塊 hash)"""
+    with open(path, 'wb') as f:
+        f.write(snapshot_bytes(blockchain))
+    return len(blockchain.chain), blockchain.chain[-1].hash
+
+
+def parse_checkpoint(checkpoint):
+    """checkpoint 為 "<高度>:<hash>" 或只有 hash，回傳 (高度或 None, hash)"""
+    height, _, tip = checkpoint.rpartition(':')
+    if not height:
+        return None, tip
+    try:
+        return int(height), tip
+    except ValueError:
+        raise ValueError(f"Invalid checkpoint {checkpoint}, expected <height>:<hash>") from None
+
+
+def load_snapshot(blockchain, path, checkpoint=None):
+    """從 snapshot 建立空節點的鏈；checkpoint 為信任的最新區塊("<高度>:<hash>" 或 hash)，不符時拒絕載入
+
+    比對的是驗證過雜湊與連結的最後一個區塊，而不是 snapshot 自己宣稱的 tip。
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {data['version']}")
+    blocks = data['blocks']
+    if not blocks:
+        raise ValueError("Snapshot has no blocks")
+    # 創世區塊沒有工作量，但 hash 仍要重新計算，否則只有一個區塊的 snapshot 可以任意填寫
+    genesis = blocks[0]
+    if header_hash(block_header(genesis['previous_hash'], genesis['timestamp'], genesis['merkle_root'],
+                                int(genesis['target'], 16)), genesis['nonce']) != genesis['hash']:
+        raise ValueError("Invalid block header at height 0")
+    error = check_headers(blocks[1:], genesis['hash'])
+    if error is not None:
+        raise ValueError(f"Invalid block header at height {error + 1}")
+    tip = blocks[-1]['hash']
+    if data['height'] != len(blocks) or data['tip'] != tip:
+        raise ValueError("Snapshot height or tip does not match its blocks")
+    if checkpoint is not None:
+        height, trusted = parse_checkpoint(checkpoint)
+        if tip != trusted or (height is not None and height != len(blocks)):
+            raise ValueError("Snapshot does not match checkpoint")
+
+    blockchain.load_chain(blocks, data['pruned_height'], data['pruned_timestamp'])
+    # 舊版 snapshot 只有 RSA 公鑰
+    blockchain.load_senders(sender if isinstance(sender, list) else [sender, 'rsa']
+                            for sender in data['authorized_senders'])
+    print(f"Loaded snapshot of {len(blocks)} blocks, tip {tip}")
+    return len(blocks), tip
+
+
+def main():
+    # python snapshot.py <node_url> <output.json.gz>
+    import requests
+
+    node_url, path = sys.argv[1], sys.argv[2]
+    response = requests.get(f"{node_url.rstrip('/')}/snapshot")
+    with open(path, 'wb') as f:
+        f.write(response.content)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    print(f"Saved snapshot to {path}")
+    print(f"Checkpoint: height {data['height']}, tip {data['tip']} (--checkpoint {data['height']}:{data['tip']})")
+
+
+if __name__ == '__main__':
+    main()
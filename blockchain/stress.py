@@ -0,0 +1,108 @@
+import argparse
+import base64
+import json
+import threading
+import time
+from collections import Counter
+
+import server
+from mempool_log import MempoolLog
+from server import BlockChain
+from signatures import RSAScheme
+
+
+def sign(sender, message, timestamp, private_key):
+    transaction_str = str({"version": 2, "sender": sender, "message": message, "timestamp": timestamp})
+    signature = RSAScheme.sign(private_key, transaction_str.encode('utf-8'))
+    return base64.b64encode(signature).decode('utf-8')
+
+
+def writer(client, sender, private_key, worker_id, count, accepted, errors):
+    """不斷送出交易到 /transaction"""
+    for i in range(count):
+        message = str({"worker": worker_id, "seq": i})
+        timestamp = int(time.time())
+        data = {
+            "data": {"sender": sender, "message": message, "timestamp": timestamp, "version": 2},
+            "signature": sign(sender, message, timestamp, private_key)
+        }
+        res = client.post('/transaction', json=data).get_json()
+        if res["success"]:
+            accepted.append(message)
+        else:
+            errors.append(res["message"])
+
+
+def reader(client, stop, errors):
+    """不斷讀取 /get_chain，確認回傳的鏈是完整的"""
+    while not stop.is_set():
+        chain = json.loads(client.get('/get_chain').data)["chain"]
+        for prev, block in zip(chain, chain[1:]):
+            if block["previous_hash"] != prev["hash"]:
+                errors.append("Broken chain snapshot")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress /transaction and /get_chain while mining")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=200, help="transactions per writer")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--wal", help="log accepted transactions to this file (group-committed fsync)")
+    args = parser.parse_args()
+
+    block = BlockChain()
+    server.block = block
+    block.create_genesis_block()
+    if args.wal:
+        MempoolLog(block, args.wal)
+    threading.Thread(target=block.mining, daemon=True).start()
+
+    sender, private_key = RSAScheme.generate()
+    block.add_authorized_sender(sender)
+
+    accepted, errors = [], []
+    stop = threading.Event()
+    start = time.time()
+
+    writers = [
+        threading.Thread(target=writer, args=(server.app.test_client(), sender, private_key,
+                                              i, args.transactions, accepted, errors))
+        for i in range(args.writers)
+    ]
+    readers = [
+        threading.Thread(target=reader, args=(server.app.test_client(), stop, errors))
+        for _ in range(args.readers)
+    ]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    submit_time = time.time() - start
+
+    # 等待交易池被清空，且最後一個區塊模板中的交易也已上鏈
+    def mined_count():
+        return sum(len(b.transactions) for b in block.chain)
+    while (len(block.mempool) or mined_count() < len(accepted)) and time.time() - start < args.timeout:
+        time.sleep(0.5)
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    mined = Counter(tx.message for b in block.chain for tx in b.transactions)
+    lost = [m for m in accepted if m not in mined]
+    duplicated = [m for m, n in mined.items() if n > 1]
+
+    print(f"Submitted {len(accepted)} transactions in {round(submit_time, 2)}s")
+    print(f"Mined {sum(mined.values())} transactions in {len(block.chain)} blocks")
+    print(f"Lost: {len(lost)}, Duplicated: {len(duplicated)}, Errors: {len(errors)}")
+    for error in errors[:10]:
+        print(f"  - {error}")
+
+    if lost or duplicated or errors or not block.verify_blockchain():
+        raise SystemExit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
+
+from difficulty import ChainPrefix, check_timestamp
+from hashing import check_headers
+
+
+class HeaderSync:
+    """headers-first 同步：分段下載並平行驗證 header，再向多個節點管線式下載區塊內容"""
+
+    def __init__(self, network, header_batch=500, body_batch=50, max_inflight=8,
+                 workers=4, parallel_threshold=2000):
+        self.network = network
+        self.blockchain = network.blockchain
+        self.header_batch = header_batch
+        self.body_batch = body_batch
+        # 同時在途的區塊內容請求數
+        self.max_inflight = max_inflight
+        self.workers = workers
+        # header 數量超過門檻才開 process pool 檢查，少量時直接檢查比較快
+        self.parallel_threshold = parallel_threshold
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight)
+        self.lock = threading.Lock()
+        self.last_sync = None
+
+    def status(self):
+        return {
+            "syncing": self.lock.locked(),
+            "height": len(self.blockchain.chain),
+            "last_sync": self.last_sync
+        }
+
+    def peer_tips(self, peers):
+        """回傳各節點主鏈的 (高度, 累積工作量)"""
+        tips = {}
+        for peer, data in zip(peers, self.executor.map(
+                lambda peer: self.network.get(peer, '/get_headers', {"start": 0, "count": 0}), peers)):
+            if data:
+                tips[peer] = (data['height'], int(data['work']))
+        return tips
+
+    def find_fork(self, peer, height):
+        """往回找對方鏈上本地也有的區塊，間距每次加倍，回傳 (高度, hash)"""
+        step = 1
+        while True:
+            data = self.network.get(peer, '/get_headers', {"start": height, "count": 1})
+            if data and data['headers'] and data['headers'][0]['hash'] in self.blockchain.tree:
+                return height, data['headers'][0]['hash']
+            if height == 0:
+                return None, None
+            height = max(height - step, 0)
+            step *= 2
+
+    def sync(self, peers):
+        """同步到已知節點中最高的鏈，回傳加入的區塊數"""
+        if not self.lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._sync(list(peers))
+        finally:
+            self.lock.release()
+
+    def _sync(self, peers):
+        tips = self.peer_tips(peers)
+        if not tips:
+            return 0
+        best_peer = max(tips, key=lambda peer: tips[peer][1])
+        best_height, best_work = tips[best_peer]
+        chain = self.blockchain.chain
+        if chain and best_work <= self.blockchain.tree.work[chain[-1].hash]:
+            return 0
+
+        start_time = time.time()
+        if not self.blockchain.chain:
+            data = self.network.get(best_peer, '/get_headers', {"start": 0, "count": 1})
+            genesis = self.fetch_bodies(best_peer, [data['headers'][0]['hash']])
+            if not genesis or not self.blockchain.receive_genesis_block(genesis[0]):
+                print(f"Error:Cannot get genesis block from {best_peer}")
+                return 0
+
+        fork_height, fork_hash = self.find_fork(
+            best_peer, min(len(self.blockchain.chain), best_height) - 1)
+        if fork_hash is None:
+            print(f"Error:Chain of {best_peer} has a different genesis block")
+            return 0
+
+        start = fork_height + 1
+        headers = self.download_headers(best_peer, start, best_height)
+        headers = self.verify_headers(headers, self.blockchain.chain_to(fork_hash))
+        headers = [h for h in headers if h['hash'] not in self.blockchain.tree]
+        if not headers:
+            return 0
+
+        # 只向高度足夠的節點要區塊內容
+        body_peers = [peer for peer, (height, _) in tips.items() if height > start] or [best_peer]
+        received = self.download_bodies(headers, body_peers, best_peer)
+
+        elapsed = time.time() - start_time
+        self.last_sync = {
+            "peer": best_peer,
+            "blocks": received,
+            "seconds": round(elapsed, 3),
+            "blocks_per_second": round(received / elapsed, 2) if elapsed > 0 else None
+        }
+        print(f"Synced {received} blocks from {best_peer} in {round(elapsed, 2)}s "
+              f"({self.last_sync['blocks_per_second']} blocks/s)")
+        return received
+
+    def download_headers(self, peer, start, height):
+        """以多個區段同時向節點下載 header"""
+        ranges = [(s, min(self.header_batch, height - s))
+                  for s in range(start, height, self.header_batch)]
+        results = self.executor.map(
+            lambda r: self.network.get(peer, '/get_headers', {"start": r[0], "count": r[1]}), ranges)
+
+        headers = []
+        for data in results:
+            if not data or not data['headers']:
+                break
+            headers.extend(data['headers'])
+        return headers
+
+    def verify_headers(self, headers, chain):
+        """平行檢查接在 chain 之後的 header 的雜湊、工作量與連結，再依序檢查難度門檻"""
+        if not headers:
+            return []
+        start = len(chain)
+        previous_hash = chain[-1].hash
+        size = max(1, -(-len(headers) // self.workers))
+        chunks = [headers[i:i + size] for i in range(0, len(headers), size)]
+        previous_hashes = [previous_hash] + [chunk[-1]['hash'] for chunk in chunks[:-1]]
+
+        if len(headers) >= self.parallel_threshold:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                errors = list(pool.map(check_headers, chunks, previous_hashes))
+        else:
+            errors = list(map(check_headers, chunks, previous_hashes))
+
+        valid = len(headers)
+        for idx, error in enumerate(errors):
+            if error is not None:
+                valid = idx * size + error
+                print(f"Error:Invalid header at height {start + valid}")
+                break
+        headers = headers[:valid]
+
+        # 難度門檻依賴前面區塊的時間，只能依序檢查，但不需要雜湊
+        views = list(chain) + [SimpleNamespace(timestamp=h['timestamp'], target=int(h['target'], 16))
+                               for h in headers]
+        policy = self.blockchain.difficulty_policy
+        for idx in range(len(headers)):
+            prefix = ChainPrefix(views, start + idx)
+            error = check_timestamp(views[start + idx].timestamp, prefix)
+            if error is not None:
+                print(f"Error:{error} at height {start + idx}")
+                return headers[:idx]
+            if views[start + idx].target != policy.next_target(prefix):
+                print(f"Error:Unexpected difficulty target at height {start + idx}")
+                return headers[:idx]
+        return headers
+
+    def fetch_bodies(self, peer, hashes):
+        data = self.network.post(peer, '/get_blocks', {"hashes": hashes})
+        if not data:
+            return None
+        blocks = data.get('blocks', [])
+        if [block['hash'] for block in blocks] != hashes:
+            return None
+        return blocks
+
+    def download_bodies(self, headers, peers, fallback_peer):
+        """依序套用區塊內容，同時讓後面的批次在背景下載"""
+        batches = deque(
+            [h['hash'] for h in headers[i:i + self.body_batch]]
+            for i in range(0, len(headers), self.body_batch))
+        inflight = deque()
+        received = 0
+        turn = 0
+
+        while batches or inflight:
+            while batches and len(inflight) < self.max_inflight:
+                hashes = batches.popleft()
+                peer = peers[turn % len(peers)]
+                turn += 1
+                inflight.append((hashes, self.executor.submit(self.fetch_bodies, peer, hashes)))
+
+            hashes, future = inflight.popleft()
+            blocks = future.result()
+            if blocks is None:
+                blocks = self.fetch_bodies(fallback_peer, hashes)
+            if blocks is None:
+                print(f"Error:Cannot fetch blocks from {fallback_peer}")
+                break
+
+            for data in blocks:
+                result, message = self.blockchain.receive_block(data)
+                if not result:
+                    print(f"Error:Block {data['hash']} rejected: {message}")
+                    for _, future in inflight:
+                        future.cancel()
+                    return received
+                received += 1
+        return received
@@ -0,0 +1,95 @@
+import random
+import statistics
+import threading
+import time
+from collections import deque
+
+
+class Trace:
+    """記錄一筆交易(或請求)經過各階段的耗時，mark() 記下距上一個階段結束的時間"""
+
+    def __init__(self, name):
+        self.name = name
+        self.timestamp = time.time()
+        self.start = self.last = time.perf_counter()
+        self.spans = []
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.spans.append((stage, now - self.last))
+        self.last = now
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "total_ms": round((self.last - self.start) * 1000, 3),
+            "spans": [(stage, round(seconds * 1000, 3)) for stage, seconds in self.spans]
+        }
+
+
+class NullTrace:
+    """未被抽樣時使用，所有操作都不做事"""
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class Tracer:
+    """依 sample_rate 抽樣追蹤，保留最近 capacity 筆完成的 trace"""
+
+    def __init__(self, sample_rate=0.0, capacity=1000):
+        self.sample_rate = sample_rate
+        self.traces = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def start(self, name):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return NULL_TRACE
+        return Trace(name)
+
+    def finish(self, trace):
+        if trace is not NULL_TRACE:
+            with self.lock:
+                self.traces.append(trace)
+
+    def mark_transactions(self, transactions, stage):
+        """區塊層級的階段(組裝、PoW、上鏈)記到區塊內每筆被抽樣的交易"""
+        if not self.sample_rate:
+            return
+        for transaction in transactions:
+            if transaction.trace is not None:
+                transaction.trace.mark(stage)
+
+    def finish_transactions(self, transactions):
+        for transaction in transactions:
+            if transaction.trace is not None:
+                self.finish(transaction.trace)
+                transaction.trace = None
+
+    def summary(self, recent=20):
+        with self.lock:
+            traces = list(self.traces)
+        stages = {}
+        for trace in traces:
+            for stage, seconds in trace.spans:
+                stages.setdefault((trace.name, stage), []).append(seconds * 1000)
+
+        summary = {}
+        for (name, stage), values in stages.items():
+            values.sort()
+            summary.setdefault(name, {})[stage] = {
+                "count": len(values),
+                "mean_ms": round(statistics.fmean(values), 3),
+                "p50_ms": round(values[len(values) // 2], 3),
+                "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))], 3)
+            }
+        return {
+            "sample_rate": self.sample_rate,
+            "traces": len(traces),
+            "stages": summary,
+            "recent": [trace.to_dict() for trace in traces[-recent:]] if recent > 0 else []
+        }
@@ -0,0 +1,103 @@
+import gzip
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # 沒有安裝時只提供 JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 沒有安裝時只提供 gzip
+    zstandard = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+# 小於這個大小的回應壓縮後也省不了多少，直接送出
+MIN_COMPRESS_SIZE = 1024
+# 請求解壓縮後的上限，避免小小的壓縮炸彈耗盡記憶體；節點也以此限制未解壓縮的請求大小
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# 回應(例如整條鏈)可能比請求大得多，另外設定上限
+MAX_RESPONSE_SIZE = 1024 * 1024 * 1024
+
+
+def accepted_encodings(header):
+    """解析 Accept-Encoding，回傳 q 值不為 0 的編碼集合"""
+    encodings = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name and params.strip() not in ('q=0', 'q=0.0'):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def wants_msgpack(accept):
+    return msgpack is not None and accept is not None and \
+        (MSGPACK in accept or 'application/x-msgpack' in accept)
+
+
+def encode_response(data, accept=None, accept_encoding=None):
+    """依 Accept / Accept-Encoding 編碼回應，回傳 (body, content_type, content_encoding)"""
+    if wants_msgpack(accept):
+        body, content_type = msgpack.packb(data), MSGPACK
+    else:
+        body, content_type = json.dumps(data).encode('utf-8'), JSON
+
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encodings = accepted_encodings(accept_encoding)
+        if zstandard is not None and 'zstd' in encodings:
+            body, encoding = zstandard.ZstdCompressor(level=3).compress(body), 'zstd'
+        elif 'gzip' in encodings:
+            body, encoding = gzip.compress(body, compresslevel=6), 'gzip'
+    return body, content_type, encoding
+
+
+def decompress(body, content_encoding, max_size):
+    """解壓縮 gzip / zstd 內容，輸出超過 max_size 時在解壓縮途中就放棄"""
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(body, max_size)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Decompressed body exceeds {max_size} bytes")
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip body")
+        return body
+    if content_encoding == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd body received but zstandard is not installed")
+        with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+            body = reader.read(max_size + 1)
+        if len(body) > max_size:
+            raise ValueError(f"Decompressed body exceeds {max_size} bytes")
+        return body
+    if content_encoding not in (None, '', 'identity'):
+        raise ValueError(f"Unsupported content encoding {content_encoding}")
+    if len(body) > max_size:
+        raise ValueError(f"Body exceeds {max_size} bytes")
+    return body
+
+
+def decode_body(body, content_type=None, content_encoding=None, max_size=MAX_BODY_SIZE):
+    """解碼請求或回應的內容，支援 gzip / zstd 壓縮與 JSON / MessagePack"""
+    body = decompress(body, content_encoding, max_size)
+    if content_type and ('msgpack' in content_type):
+        if msgpack is None:
+            raise ValueError("MessagePack body received but msgpack is not installed")
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def client_headers():
+    """客戶端請求時帶上的 Accept 標頭，依已安裝的套件選擇格式"""
+    headers = {'Accept-Encoding': 'zstd, gzip' if zstandard is not None else 'gzip'}
+    headers['Accept'] = f'{MSGPACK}, {JSON};q=0.5' if msgpack is not None else JSON
+    return headers
+
+
+def decode_response(response):
+    """解碼以 stream=True 取得的 requests 回應(不讓 urllib3 自動解壓縮)"""
+    body = response.raw.read(decode_content=False)
+    return decode_body(body, response.headers.get('Content-Type'),
+                       response.headers.get('Content-Encoding'), MAX_RESPONSE_SIZE)
@@ -0,0 +1,204 @@
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+
+from config import parse_args
+from record_socket import read_records
+
+CODEC = "delta-zlib"
+# 讀值先乘上 SCALE 轉成整數再做差分
+SCALE = 100
+
+
+def encode_series(readings, fields):
+    """把 [{timestamp, field...}] 依欄位轉成整數差分序列，再以 zlib 壓縮；缺值沿用前一筆"""
+    columns = []
+    for field in ["timestamp"] + fields:
+        previous = 0
+        deltas = []
+        for reading in readings:
+            value = reading.get(field)
+            value = previous if value is None else round(float(value) * SCALE)
+            deltas.append(value - previous)
+            previous = value
+        columns.append(deltas)
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decode_series(data, fields):
+    columns = json.loads(zlib.decompress(data))
+    readings = [{} for _ in columns[0]]
+    for field, deltas in zip(["timestamp"] + fields, columns):
+        value = 0
+        for reading, delta in zip(readings, deltas):
+            value += delta
+            reading[field] = value / SCALE
+    return readings
+
+
+def to_number(value):
+    """轉成可編碼的有限數值，無法轉換、nan、inf 或乘上 SCALE 後溢位時回傳 None"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value * SCALE) else None
+
+
+class EdgeAggregator:
+    """依感測器暫存讀值，每個時間窗壓縮成一筆交易
+
+    mode 為 "batch" 時交易內含壓縮後的整段資料；為 "anchor" 時原始資料留在
+    archive_dir，鏈上只記錄它的 SHA-256。
+    """
+
+    def __init__(self, submit, window=300.0, mode="batch", archive_dir="series"):
+        self.submit = submit
+        self.window = window
+        self.mode = mode
+        self.archive_dir = archive_dir
+        # sensor -> (欄位, 讀值)
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def add(self, sensor, reading):
+        """加入一筆讀值；無效的欄位值在這裡丟棄(之後沿用前一筆)，避免整個時間窗在壓縮時失敗"""
+        timestamp = to_number(reading.get("timestamp"))
+        if timestamp is None:
+            return False
+        values = {key: to_number(value) for key, value in reading.items() if key != "timestamp"}
+        reading = {key: value for key, value in values.items() if value is not None}
+        if not reading:
+            return False
+        reading["timestamp"] = timestamp
+        fields = sorted(key for key in reading if key != "timestamp")
+        with self.lock:
+            if sensor not in self.buffers:
+                self.buffers[sensor] = (fields, [])
+            buffer_fields, readings = self.buffers[sensor]
+            for field in fields:
+                if field not in buffer_fields:
+                    buffer_fields.append(field)
+            readings.append(reading)
+        return True
+
+    def flush(self):
+        with self.lock:
+            buffers = self.buffers
+            self.buffers = {}
+        for sensor, (fields, readings) in buffers.items():
+            self.submit(self.build_message(sensor, fields, readings))
+
+    def build_message(self, sensor, fields, readings):
+        data = encode_series(readings, fields)
+        message = {
+            "sensor": sensor,
+            "start": readings[0]["timestamp"],
+            "end": readings[-1]["timestamp"],
+            "count": len(readings),
+            "codec": CODEC,
+            "fields": fields
+        }
+        if self.mode == "anchor":
+            digest = hashlib.sha256(data).hexdigest()
+            os.makedirs(self.archive_dir, exist_ok=True)
+            with open(os.path.join(self.archive_dir, f"{sensor}-{digest}.bin"), 'wb') as f:
+                f.write(data)
+            message["anchor"] = digest
+        else:
+            message["data"] = base64.b64encode(data).decode('ascii')
+        return message
+
+    def run(self, readings):
+        """readings 為 (sensor, reading) 的 queue，每 window 秒送出一次"""
+        deadline = time.monotonic() + self.window
+        while True:
+            try:
+                sensor, reading = readings.get(timeout=max(0.0, deadline - time.monotonic()))
+                self.add(sensor, reading)
+            except queue.Empty:
+                pass
+            if time.monotonic() >= deadline:
+                self.flush()
+                deadline += self.window
+
+
+def flatten(record):
+    """把 dht22.py 的時間窗紀錄轉成 {timestamp, temperature, humidity}"""
+    reading = {"timestamp": record.get("end", record.get("timestamp", time.time()))}
+    for key, value in record.items():
+        if isinstance(value, dict) and "median" in value:
+            reading[key] = value["median"]
+    return reading
+
+
+def follow_socket(path, readings):
+    while True:
+        try:
+            for record in read_records(path):
+                readings.put((record.get("sensor", os.path.basename(path)), flatten(record)))
+        except OSError as e:
+            print(f"Cannot read {path}: {e}")
+        time.sleep(5)
+
+
+def follow_stdin(fields, readings):
+    # Node-RED 組好的 "temperature humidity PM2.5" 一行一筆
+    for line in sys.stdin:
+        values = line.split()
+        if len(values) != len(fields):
+            continue
+        reading = {"timestamp": time.time()}
+        reading.update(zip(fields, values))
+        readings.put(("env", reading))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch sensor readings before sending them to the chain")
+    parser.add_argument("--server", default="http://192.168.50.175:8000", help="blockchain node URL")
+    parser.add_argument("--window", type=float, default=300.0, help="seconds per batch")
+    parser.add_argument("--mode", choices=["batch", "anchor"], default="batch",
+                        help="put the compressed series on chain, or only its hash")
+    parser.add_argument("--archive-dir", default="series",
+                        help="where anchor mode keeps the raw series")
+    parser.add_argument("--socket", action="append", default=[],
+                        help="record socket to follow, e.g. /tmp/dht22.sock (repeatable)")
+    parser.add_argument("--stdin-fields", nargs="*",
+                        help="also read space separated readings with these fields from stdin")
+    args = parse_args(parser, 'aggregator')
+
+    from blockchain_client import BlockchainTester
+    from client_1 import PRIVATE_KEY, PUBLIC_KEY
+
+    tester = BlockchainTester(args.server, PUBLIC_KEY, PRIVATE_KEY)
+    tester.register_sender()
+
+    def submit(message):
+        try:
+            tester.send_transaction(str(message))
+        except Exception as e:
+            print(f"Error sending batch: {e}")
+
+    readings = queue.Queue()
+    for path in args.socket:
+        threading.Thread(target=follow_socket, args=(path, readings), daemon=True).start()
+    if args.stdin_fields:
+        threading.Thread(target=follow_stdin, args=(args.stdin_fields, readings), daemon=True).start()
+
+    aggregator = EdgeAggregator(submit, args.window, args.mode, args.archive_dir)
+    try:
+        aggregator.run(readings)
+    except KeyboardInterrupt:
+        aggregator.flush()
+
+
+if __name__ == '__main__':
+    main()
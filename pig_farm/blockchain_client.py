@@ -0,0 +1,192 @@
+import json
+import base64
+import hashlib
+import rsa
+import time
+import os
+import gzip
+# 每筆讀值都會啟動一次 client，以標準函式庫的 urllib 取代載入約 0.1 秒的 requests
+import urllib.error
+import urllib.request
+
+try:
+    import msgpack
+except ImportError:  # 沒有安裝時使用 JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 沒有安裝時只接受 gzip
+    zstandard = None
+
+SERVER_URL = "http://192.168.50.175:8000"
+
+
+def public_key_str(public_key):
+    """RSA 公鑰去掉 PEM 標頭與換行後的字串，即節點登記的發送者公鑰"""
+    text = str(public_key.save_pkcs1()).replace('\\n', '')
+    text = text.replace("b'-----BEGIN RSA PUBLIC KEY-----", '')
+    return text.replace("-----END RSA PUBLIC KEY-----'", '')
+
+
+def sender_id(public_key):
+    """交易中使用的 sender id：公鑰字串的 SHA-256 前 40 個十六進位字元"""
+    return hashlib.sha256(public_key.encode('utf-8')).hexdigest()[:40]
+
+
+class BlockchainTester:
+    """client_1 / client_2 等感測程式共用的節點客戶端，RSA 金鑰由各程式提供"""
+
+    def __init__(self, server_url=SERVER_URL, public_key=None, private_key=None, scheme="rsa",
+                 key_file="ed25519.key"):
+        self.server_url = server_url
+        # 簽章演算法：rsa 或 ed25519
+        self.scheme = scheme
+        self.public_key = public_key
+        self.private_key = private_key
+        if scheme == "ed25519":
+            self.load_ed25519_key(key_file)
+
+    def load_ed25519_key(self, key_file):
+        """讀取 Ed25519 私鑰，檔案不存在時產生新的金鑰並保存"""
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        from cryptography.hazmat.primitives import serialization
+
+        if os.path.exists(key_file):
+            with open(key_file, 'rb') as f:
+                self.private_key = Ed25519PrivateKey.from_private_bytes(f.read())
+        else:
+            self.private_key = Ed25519PrivateKey.generate()
+            # 私鑰只給擁有者讀取
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.private_key.private_bytes(
+                    serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                    serialization.NoEncryption()))
+        self.public_key = self.private_key.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        
+    def request_headers(self):
+        """有安裝 msgpack / zstandard 時請伺服器回傳較小的格式"""
+        headers = {"Accept-Encoding": "zstd, gzip" if zstandard is not None else "gzip"}
+        if msgpack is not None:
+            headers["Accept"] = "application/msgpack, application/json;q=0.5"
+        return headers
+
+    def post(self, url, data):
+        """有安裝 msgpack 時以 MessagePack 送出請求"""
+        if msgpack is None:
+            headers = dict(self.request_headers(), **{"Content-Type": "application/json"})
+            body = json.dumps(data).encode('utf-8')
+        else:
+            headers = dict(self.request_headers(), **{"Content-Type": "application/msgpack"})
+            body = msgpack.packb(data)
+        return self.open(urllib.request.Request(url, data=body, headers=headers))
+
+    def open(self, request):
+        """送出請求並解碼回應；錯誤狀態(例如 429)的回應內容同樣解碼後回傳"""
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return self.decode_response(response.read(), response.headers)
+        except urllib.error.HTTPError as e:
+            return self.decode_response(e.read(), e.headers)
+
+    def decode_response(self, body, headers):
+        """依 Content-Encoding / Content-Type 解壓縮並解碼回應"""
+        encoding = headers.get("Content-Encoding")
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "zstd":
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        if "msgpack" in headers.get("Content-Type", ""):
+            return msgpack.unpackb(body)
+        return json.loads(body)
+
+    def get_public_key_str(self):
+        """獲取格式化的公鑰字符串"""
+        if self.scheme == "ed25519":
+            return base64.b64encode(self.public_key).decode('utf-8')
+        return public_key_str(self.public_key)
+
+    def get_sender_id(self):
+        """交易中使用的 sender id：公鑰字串的 SHA-256 前 40 個十六進位字元"""
+        return sender_id(self.get_public_key_str())
+
+    def register_sender(self):
+        """註冊發送者"""
+        url = f"{self.server_url}/register_sender"
+        data = {
+            "public_key": self.get_public_key_str(),
+            "scheme": self.scheme
+        }
+        result = self.post(url, data)
+        print("Register Sender Response:", result)
+        return result
+
+    def create_and_sign_transaction(self, message):
+        """創建並簽名交易"""
+        # 建交易數據
+        transaction_data = {
+            "sender": self.get_sender_id(),
+            "message": message,
+            "timestamp": int(time.time()),
+            "version": 2
+        }
+        
+        # 生成交易字符串(版本 2：時間也在簽章範圍內)
+        transaction_str = str({
+            "version": 2,
+            "sender": transaction_data["sender"],
+            "message": transaction_data["message"],
+            "timestamp": transaction_data["timestamp"]
+        })
+        
+        # 簽名
+        if self.scheme == "ed25519":
+            signature = self.private_key.sign(transaction_str.encode('utf-8'))
+        else:
+            signature = rsa.sign(
+                transaction_str.encode('utf-8'),
+                self.private_key,
+                'SHA-1'
+            )
+        
+        # Base64編碼簽名
+        signature_b64 = base64.b64encode(signature).decode('utf-8')
+        
+        return transaction_data, signature_b64
+
+    def send_transaction(self, message):
+        """發送交易"""
+        url = f"{self.server_url}/transaction"
+        transaction_data, signature = self.create_and_sign_transaction(message)
+        
+        data = {
+            "data": transaction_data,
+            "signature": signature
+        }
+        
+        result = self.post(url, data)
+        print("Send Transaction Response:", result)
+        return result
+
+    def get_chain(self):
+        """獲取區塊鏈"""
+        url = f"{self.server_url}/get_chain"
+        try:
+            chain_data = self.open(urllib.request.Request(url, headers=self.request_headers()))
+            print("\nBlockchain:")
+            for block in chain_data["chain"]:
+                print(f"Block Hash: {block['hash']}")
+                print(f"Miner: {block['miner']}")
+                print(f"Difficulty: {block['difficulty']}")
+                if block['transactions']:
+                    print("Transactions:")
+                    for tx in block['transactions']:
+                        print(f"  - From: {tx['sender'][:30]}...")
+                        print(f"    Message: {tx['message']}")
+                print("---")
+            return chain_data
+        except Exception as e:
+            print(f"Error getting chain: {e}")
+            return None
@@ -0,0 +1,101 @@
+import json
+import os
+
+ENV_PREFIX = 'FARM_'
+# 沒有指定 --config 或 FARM_CONFIG 時，讀取與程式放在一起的 farm.json(若存在)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'farm.json')
+# 可寫在設定檔頂層、所有程式共用的設定；其他設定只能寫在各程式的區段
+SHARED = {'server', 'scheme', 'key_file'}
+
+
+def config_path(path=None):
+    path = path or os.environ.get(ENV_PREFIX + 'CONFIG')
+    if path:
+        return path
+    return DEFAULT_PATH if os.path.exists(DEFAULT_PATH) else None
+
+
+def raw_settings(name, keys, path=None):
+    """讀取設定檔與環境變數中屬於 name 的設定，回傳 (名稱 -> 原始值, 來源說明)
+
+    設定檔頂層為 SHARED 中的共用設定，name 區段只給該程式：
+    {"server": "http://node:8000", "dht22": {"interval": 5}}
+    環境變數 FARM_<NAME>_<KEY> 優先於共用的 FARM_<KEY>，再優先於設定檔。
+    """
+    values, sources = {}, {}
+    path = config_path(path)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} must contain a JSON object")
+        for key, value in data.items():
+            if isinstance(value, dict):
+                continue
+            if key not in SHARED:
+                raise ValueError(f"{path}: {key} is not a shared setting, set it in a program section")
+            if key in keys:
+                values[key], sources[key] = value, path
+        section = data.get(name, {})
+        if not isinstance(section, dict):
+            raise ValueError(f"{path}: {name} must be a JSON object")
+        for key, value in section.items():
+            if key not in keys:
+                raise ValueError(f"{path}: unknown setting {key} for {name}, expected one of {sorted(keys)}")
+            values[key], sources[key] = value, path
+    for key in keys:
+        names = [ENV_PREFIX + key.upper()] if key in SHARED else []
+        for env in names + [f"{ENV_PREFIX}{name.upper()}_{key.upper()}"]:
+            if env in os.environ:
+                values[key], sources[key] = os.environ[env], env
+    return values, sources
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def load_settings(name, defaults, path=None):
+    """沒有命令列參數的程式(client_1.py 等)使用：依 defaults 的型別轉換"""
+    values, _ = raw_settings(name, set(defaults), path)
+    settings = dict(defaults)
+    for key, value in values.items():
+        kind = type(defaults[key])
+        settings[key] = to_bool(value) if kind is bool else value if defaults[key] is None else kind(value)
+    return settings
+
+
+def parse_args(parser, name, argv=None):
+    """以設定檔與環境變數作為 argparse 的預設值，命令列參數仍然優先"""
+    parser.add_argument("--config", help=f"JSON settings file (env: {ENV_PREFIX}CONFIG, "
+                                         f"default: farm.json next to this script)")
+    known, _ = parser.parse_known_args(argv)
+    actions = {action.dest: action for action in parser._actions
+               if action.dest not in ('help', 'config') and action.option_strings}
+    try:
+        values, sources = raw_settings(name, set(actions), known.config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    defaults = {}
+    for key, value in values.items():
+        action = actions[key]
+        kind = action.type or str
+        try:
+            if action.const is True and not action.nargs:
+                value = to_bool(value)
+            elif action.nargs in ('*', '+') or isinstance(action.default, list):
+                if isinstance(value, str):
+                    value = value.replace(',', ' ').split()
+                value = [kind(item) for item in value]
+            else:
+                value = kind(value)
+        except (TypeError, ValueError):
+            parser.error(f"invalid value {value!r} for {key} from {sources[key]}")
+        if action.choices is not None and value not in action.choices:
+            parser.error(f"{key} from {sources[key]} must be one of {list(action.choices)}")
+        defaults[key] = value
+    parser.set_defaults(**defaults)
+    return parser.parse_args(argv)
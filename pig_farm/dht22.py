@@ -1,14 +1,203 @@
-import adafruit_dht
-import board
+import argparse
+import statistics
 import time
+from collections import deque
 
-dhtDevice = adafruit_dht.DHT22(board.D4, use_pulseio=False)
+from config import parse_args
+from record_socket import RecordServer
+
+# DHT22 規格的量測範圍
+TEMPERATURE_RANGE = (-40.0, 80.0)
+HUMIDITY_RANGE = (0.0, 100.0)
+
+
+def open_device(pin):
+    import adafruit_dht
+    import board
+
+    return adafruit_dht.DHT22(getattr(board, pin), use_pulseio=False)
+
+
+class OutlierFilter:
+    """超出量測範圍，或與最近幾筆讀值的中位數相差超過 max_jump 的讀值視為異常
+
+    被拒絕的讀值仍會記入歷史，溫濕度真的改變時中位數會跟上，不會一直拒絕。
+    """
+
+    def __init__(self, value_range, max_jump, history=5):
+        self.low, self.high = value_range
+        self.max_jump = max_jump
+        self.recent = deque(maxlen=history)
+
+    def accept(self, value):
+        if value is None or not self.low <= value <= self.high:
+            return False
+        ok = len(self.recent) < 3 or abs(value - statistics.median(self.recent)) <= self.max_jump
+        self.recent.append(value)
+        return ok
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "median": round(statistics.median(values), 2),
+        "mean": round(statistics.fmean(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2)
+    }
+
+
+class DHT22Sampler:
+    """定時讀取 DHT22，過濾失敗與異常的讀值，每個時間窗輸出一筆統計紀錄"""
+
+    def __init__(self, pin='D4', interval=2.0, window=60.0, max_failures=5,
+                 min_change=0.1, heartbeat=300.0):
+        self.pin = pin
+        # DHT22 兩次讀取至少要間隔 2 秒，太快只會讀到上一次的值
+        self.interval = interval
+        self.window = window
+        # 連續失敗幾次就重新初始化裝置
+        self.max_failures = max_failures
+        # 與上次輸出相比變化小於 min_change 時不輸出，但每 heartbeat 秒至少輸出一次
+        self.min_change = min_change
+        self.heartbeat = heartbeat
+        self.temperature_filter = OutlierFilter(TEMPERATURE_RANGE, max_jump=3.0)
+        self.humidity_filter = OutlierFilter(HUMIDITY_RANGE, max_jump=10.0)
+        self.device = None
+        self.failures = 0
+        self.last_record = None
+        self.reset_window()
+
+    def reset_window(self):
+        self.window_start = time.time()
+        self.temperatures = []
+        self.humidities = []
+        self.failed = 0
+        self.rejected = 0
+
+    def reinitialize(self):
+        if self.device is not None:
+            try:
+                self.device.exit()
+            except Exception as e:
+                print(f"Error closing DHT22: {e}")
+        self.device = None
+        self.failures = 0
+        try:
+            self.device = open_device(self.pin)
+        except Exception as e:
+            print(f"Error opening DHT22 on {self.pin}: {e}")
+
+    def sample(self):
+        if self.device is None:
+            self.reinitialize()
+            if self.device is None:
+                self.failed += 1
+                return
+
+        try:
+            temperature = self.device.temperature
+            humidity = self.device.humidity
+        except RuntimeError:
+            # DHT22 常見的 checksum / timing 錯誤，下次通常就會成功
+            temperature = humidity = None
+        except Exception as e:
+            print(f"Error reading DHT22: {e}")
+            self.reinitialize()
+            self.failed += 1
+            return
+
+        if temperature is None or humidity is None:
+            self.failed += 1
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                print(f"DHT22 failed {self.failures} times in a row, reinitializing")
+                self.reinitialize()
+            return
+        self.failures = 0
+
+        if self.temperature_filter.accept(temperature) and self.humidity_filter.accept(humidity):
+            self.temperatures.append(temperature)
+            self.humidities.append(humidity)
+        else:
+            self.rejected += 1
+
+    def flush(self):
+        """結束目前的時間窗，回傳要輸出的紀錄；沒有有效讀值或沒有明顯變化時回傳 None"""
+        record = {
+            "sensor": "dht22",
+            "start": self.window_start,
+            "end": time.time(),
+            "samples": len(self.temperatures),
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "temperature": summarize(self.temperatures),
+            "humidity": summarize(self.humidities)
+        }
+        self.reset_window()
+        if not record["samples"] or not self.changed(record):
+            return None
+        self.last_record = record
+        return record
+
+    def changed(self, record):
+        last = self.last_record
+        if last is None or record["end"] - last["end"] >= self.heartbeat:
+            return True
+        return any(abs(record[key]["median"] - last[key]["median"]) >= self.min_change
+                   for key in ("temperature", "humidity"))
+
+    def run(self, emit):
+        next_sample = time.monotonic()
+        window_end = next_sample + self.window
+        while True:
+            self.sample()
+            if time.monotonic() >= window_end:
+                record = self.flush()
+                if record is not None:
+                    emit(record)
+                window_end += self.window
+            # 以固定時刻排程，讀取花的時間不會累積成漂移
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample a DHT22 and emit windowed readings")
+    parser.add_argument("--pin", default="D4", help="board pin the DHT22 data line is on")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between reads")
+    parser.add_argument("--window", type=float, default=60.0, help="seconds per emitted record")
+    parser.add_argument("--max-failures", type=int, default=5,
+                        help="consecutive failed reads before reinitializing the device")
+    parser.add_argument("--min-change", type=float, default=0.1,
+                        help="skip records whose medians moved less than this since the last one")
+    parser.add_argument("--heartbeat", type=float, default=300.0,
+                        help="emit at least once every this many seconds")
+    parser.add_argument("--socket", default="/tmp/dht22.sock",
+                        help="Unix socket that streams JSON records")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not print 'temperature humidity' lines for Node-RED")
+    args = parse_args(parser, 'dht22')
+
+    sampler = DHT22Sampler(args.pin, args.interval, args.window, args.max_failures,
+                           args.min_change, args.heartbeat)
+    server = RecordServer(args.socket)
+
+    def emit(record):
+        server.send(record)
+        if not args.quiet:
+            print(f"{record['temperature']['median']} {record['humidity']['median']}", flush=True)
 
-while True:
     try:
-        temperature = dhtDevice.temperature
-        humidity = dhtDevice.humidity
-        print(f"{temperature} {humidity}")
-        time.sleep(0.5)
-    except:
-        dhtDevice.exit()
+        sampler.run(emit)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sampler.device is not None:
+            sampler.device.exit()
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
+import argparse
 import time
 import sys
-import RPi.GPIO as GPIO
-from hx711 import HX711
+
+from config import parse_args
+from scale import ContinuousScale, MockHX711
 
 def cleanAndExit():
     print("Cleaning...")
@@ -9,7 +11,17 @@ def cleanAndExit():
     print("Bye!")
     sys.exit()
 
-hx = HX711(5, 6)
+parser = argparse.ArgumentParser(description="Print the moving-median weight of an HX711 load cell")
+parser.add_argument("--mock", help="replay raw values recorded with --record instead of using the HX711")
+parser.add_argument("--record", help="save raw values to this file")
+parser.add_argument("--interval", type=float, default=0.1, help="seconds between printed weights")
+args = parse_args(parser, 'example')
+
+if args.mock:
+    hx = MockHX711(args.mock)
+else:
+    from hx711 import HX711
+    hx = HX711(5, 6)
 
 '''
 I've found out that, for some reason, the order of the bytes is not always the same between versions of python,
@@ -39,42 +51,25 @@ because if I used the 114000, I'd be getting milligrams instead of grams.
 '''
 
 referenceUnit = 457
-hx.set_reference_unit(referenceUnit)
 
-hx.reset()
-
-hx.tare()
+# 保持 HX711 供電，背景持續讀值，不再每次讀取都 power_down() / power_up() 並等待 5 筆平均
+scale = ContinuousScale(hx, referenceUnit)
+if args.record:
+    scale.recorder = open(args.record, 'w')
+scale.start()
 
 #print("Tare done! Add weight now...")
 
-# to use both channels, you'll need to tare them both
-#hx.tare_A()
-#hx.tare_B()
-
 while True:
     try:
-        # These three lines are usefull to debug wether to use MSB or LSB in the reading formats
-        # for the first parameter of "hx.set_reading_format("LSB", "MSB")".
-        # Comment the two lines "val = hx.get_weight(5)" and "print val" and uncomment these three lines to see what it prints.
-        
-        #np_arr8_string = hx.get_np_arr8_string()
-        #binary_string = hx.get_binary_string()
-        #print(binary_string + " " + np_arr8_string)
-        
-        # Prints the weight. Comment if you're debbuging the MSB and LSB issue.
-        val = hx.get_weight(5)
-        val = max(0, int(val))
-        print(val)
-
-        # To get weight from both channels (if you have load cells hooked up 
-        # to both channel A and B), do something like this
-        #val_A = hx.get_weight_A(5)
-        #val_B = hx.get_weight_B(5)
-        #print "A: %s  B: %s" % ( val_A, val_B )
-
-        hx.power_down()
-        hx.power_up()
-        time.sleep(0.1)
+        # 讀值已經在緩衝區裡，這裡只計算最近幾筆的中位數
+        val = scale.weight()
+        if val is not None:
+            print(max(0, int(val)), flush=True)
+        time.sleep(args.interval)
 
     except (KeyboardInterrupt, SystemExit):
+        scale.stop()
+        if scale.recorder is not None:
+            scale.recorder.close()
         cleanAndExit()
@@ -0,0 +1,163 @@
+import argparse
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+
+from config import parse_args
+from record_socket import RecordServer
+from scale import ContinuousScale
+
+
+class PairingEngine:
+    """依時間把 RFID 讀卡與秤重讀值配對，每次過磅只產生一筆紀錄
+
+    同一張卡在 debounce 秒內重複讀到只會延長停留時間；重量必須在讀卡前後
+    pair_window 秒內，且最近 settle_samples 筆的標準差低於 settle_stdev 才算穩定。
+    """
+
+    def __init__(self, debounce=3.0, pair_window=5.0, settle_samples=10,
+                 settle_stdev=0.5, min_weight=5.0):
+        self.debounce = debounce
+        self.pair_window = pair_window
+        self.settle_samples = settle_samples
+        self.settle_stdev = settle_stdev
+        # 低於這個重量視為秤上沒有豬
+        self.min_weight = min_weight
+        self.weights = deque()
+        self.tag = None
+        self.tag_first = None
+        self.tag_last = None
+        self.weighed = False
+
+    def on_tag(self, timestamp, tag):
+        if tag == self.tag and timestamp - self.tag_last <= self.debounce:
+            self.tag_last = timestamp
+        else:
+            self.tag = tag
+            self.tag_first = self.tag_last = timestamp
+            self.weighed = False
+        return self.pair(timestamp)
+
+    def on_weight(self, timestamp, weight):
+        self.weights.append((timestamp, weight))
+        while self.weights and self.weights[0][0] < timestamp - self.pair_window:
+            self.weights.popleft()
+        if weight < self.min_weight and self.weighed:
+            # 豬已離開秤
+            self.tag = None
+        return self.pair(timestamp)
+
+    def pair(self, now):
+        if self.tag is not None and now - self.tag_last > self.pair_window:
+            self.tag = None
+        if self.tag is None or self.weighed:
+            return None
+
+        recent = [w for t, w in self.weights if t >= self.tag_first - self.pair_window]
+        recent = recent[-self.settle_samples:]
+        if len(recent) < self.settle_samples or min(recent) < self.min_weight:
+            return None
+        stdev = statistics.pstdev(recent)
+        if stdev > self.settle_stdev:
+            return None
+
+        self.weighed = True
+        return {
+            "id": self.tag,
+            "weight": round(statistics.median(recent), 2),
+            "timestamp": now,
+            "samples": len(recent),
+            "stdev": round(stdev, 3)
+        }
+
+
+def open_scale(min_weight):
+    from hx711 import HX711
+
+    # 設定與 example.py 相同
+    hx = HX711(5, 6)
+    hx.set_reading_format("MSB", "MSB")
+    # 低於 min_weight 才視為空秤，自動歸零不會吃掉輕豬的重量
+    scale = ContinuousScale(hx, reference_unit=457, zero_band=min_weight)
+    scale.start()
+    return scale
+
+
+def read_tags(events):
+    from mfrc522 import SimpleMFRC522
+
+    reader = SimpleMFRC522()
+    while True:
+        tag = reader.read_id()
+        events.put(("tag", time.time(), str(tag)))
+
+
+def read_weights(events, interval, min_weight):
+    scale = open_scale(min_weight)
+    while True:
+        weight = scale.weight()
+        if weight is not None:
+            events.put(("weight", time.time(), weight))
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pair RFID tags with settled scale readings")
+    parser.add_argument("--server", default="http://192.168.50.175:8000", help="blockchain node URL")
+    parser.add_argument("--debounce", type=float, default=3.0,
+                        help="seconds within which repeated reads of a tag are ignored")
+    parser.add_argument("--pair-window", type=float, default=5.0,
+                        help="seconds around a tag read whose weights may be paired with it")
+    parser.add_argument("--settle-samples", type=int, default=10,
+                        help="number of recent weights that must be stable")
+    parser.add_argument("--settle-stdev", type=float, default=0.5,
+                        help="maximum standard deviation of a settled weight, in scale units")
+    parser.add_argument("--min-weight", type=float, default=5.0,
+                        help="weights below this mean the scale is empty, in scale units")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between scale reads")
+    parser.add_argument("--socket", default="/tmp/pairing.sock",
+                        help="Unix socket that streams JSON weigh-in records")
+    parser.add_argument("--dry-run", action="store_true", help="do not send weigh-ins to the chain")
+    args = parse_args(parser, 'pairing')
+
+    from blockchain_client import BlockchainTester
+    from client_2 import PRIVATE_KEY, PUBLIC_KEY
+
+    engine = PairingEngine(args.debounce, args.pair_window, args.settle_samples,
+                           args.settle_stdev, args.min_weight)
+    server = RecordServer(args.socket)
+    tester = BlockchainTester(args.server, PUBLIC_KEY, PRIVATE_KEY)
+    if not args.dry_run:
+        tester.register_sender()
+
+    events = queue.Queue()
+    threading.Thread(target=read_tags, args=(events,), daemon=True).start()
+    threading.Thread(target=read_weights, args=(events, args.interval, args.min_weight), daemon=True).start()
+
+    try:
+        while True:
+            kind, timestamp, value = events.get()
+            if kind == "tag":
+                record = engine.on_tag(timestamp, value)
+            else:
+                record = engine.on_weight(timestamp, value)
+            if record is None:
+                continue
+
+            print(f"{record['id']} {record['weight']}", flush=True)
+            server.send(record)
+            if not args.dry_run:
+                try:
+                    tester.send_transaction(str({"id": record["id"], "weight": record["weight"]}))
+                except Exception as e:
+                    print(f"Error sending weigh-in: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,16 @@ from mfrc522 import SimpleMFRC522
 import time
 import sys
 
+from config import load_settings
+
+# 讀取間隔可由 farm.json 的 read 區段或 FARM_READ_INTERVAL 設定
+settings = load_settings('read', {'interval': 0.5})
 reader = SimpleMFRC522()
 while True:
     try:
         id = reader.read_id()
         print(id)
-        time.sleep(0.5)
+        time.sleep(settings['interval'])
     except:
         break
 GPIO.cleanup()
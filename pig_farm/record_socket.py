@@ -0,0 +1,57 @@
+import json
+import os
+import socket
+import threading
+
+
+class RecordServer:
+    """在 Unix domain socket 上把感測紀錄以 JSON lines 推送給所有連線的程式"""
+
+    def __init__(self, path):
+        self.path = path
+        self.clients = []
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.clients.append(conn)
+
+    def send(self, record):
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with self.lock:
+            for conn in list(self.clients):
+                try:
+                    conn.sendall(line)
+                except OSError:
+                    # 對方已斷線
+                    conn.close()
+                    self.clients.remove(conn)
+
+    def close(self):
+        with self.lock:
+            for conn in self.clients:
+                conn.close()
+            self.clients = []
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def read_records(path):
+    """連到 RecordServer，逐筆產生收到的紀錄"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    with sock, sock.makefile('r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
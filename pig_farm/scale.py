@@ -0,0 +1,137 @@
+import statistics
+import threading
+import time
+from collections import deque
+
+
+class MockHX711:
+    """重播錄下的原始讀值，介面與 hx711py 的 HX711 相同，不需要硬體就能測試"""
+
+    def __init__(self, values, rate=80.0, loop=True):
+        if isinstance(values, str):
+            with open(values) as f:
+                values = [int(line) for line in f if line.strip()]
+        self.values = list(values)
+        # HX711 的取樣率為 10 或 80 SPS
+        self.rate = rate
+        self.loop = loop
+        self.index = 0
+
+    def read_long(self):
+        if self.index >= len(self.values):
+            if not self.loop:
+                raise EOFError("No more recorded values")
+            self.index = 0
+        value = self.values[self.index]
+        self.index += 1
+        if self.rate:
+            time.sleep(1 / self.rate)
+        return value
+
+    def set_reading_format(self, byte_format, bit_format):
+        pass
+
+    def set_reference_unit(self, reference_unit):
+        pass
+
+    def reset(self):
+        pass
+
+    def power_down(self):
+        pass
+
+    def power_up(self):
+        pass
+
+
+class ContinuousScale:
+    """讓 HX711 保持供電，背景執行緒持續把原始讀值放進環形緩衝區
+
+    重量在需要時才以最近幾筆的中位數計算；整個緩衝區的讀值都在零點 zero_band 以內
+    (秤上確定沒有東西)且穩定時，若零點漂移超過 drift_threshold 就自動重新歸零，
+    兩次歸零至少相隔 retare_interval 秒。zero_band 應不大於判斷秤上有豬的重量
+    (pairing.py 的 --min-weight)，否則站著不動的輕豬會被當成漂移歸零。
+    """
+
+    def __init__(self, hx, reference_unit=457, size=64, window=8,
+                 zero_band=5.0, drift_threshold=1.0, stable_stdev=1.0, retare_interval=30.0):
+        self.hx = hx
+        self.reference_unit = reference_unit
+        self.samples = deque(maxlen=size)
+        # 計算重量時使用的讀值筆數
+        self.window = window
+        # 以下門檻皆為重量單位
+        self.zero_band = zero_band
+        self.drift_threshold = drift_threshold
+        self.stable_stdev = stable_stdev
+        self.retare_interval = retare_interval
+        self.offset = 0
+        self.tared_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.recorder = None
+
+    def start(self, tare=True):
+        self.hx.reset()
+        if tare:
+            self.tare()
+        self.running = True
+        self.thread = threading.Thread(target=self.acquire, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.hx.power_down()
+
+    def acquire(self):
+        while self.running:
+            try:
+                value = self.hx.read_long()
+            except EOFError:
+                self.running = False
+                return
+            with self.lock:
+                self.samples.append(value)
+            if self.recorder is not None:
+                self.recorder.write(f"{value}\n")
+            self.track_zero()
+
+    def tare(self, times=16):
+        values = [self.hx.read_long() for _ in range(times)]
+        self.offset = statistics.median(values)
+        self.tared_at = time.monotonic()
+
+    def recent(self, count=None):
+        with self.lock:
+            samples = list(self.samples)
+        return samples[-(count or self.window):]
+
+    def weight(self, count=None):
+        """最近 count 筆讀值的中位數重量；緩衝區還是空的時回傳 None"""
+        samples = self.recent(count)
+        if not samples:
+            return None
+        return (statistics.median(samples) - self.offset) / self.reference_unit
+
+    def stdev(self, count=None):
+        samples = self.recent(count)
+        if len(samples) < 2:
+            return None
+        return statistics.pstdev(samples) / self.reference_unit
+
+    def track_zero(self):
+        samples = self.recent(self.samples.maxlen)
+        if len(samples) < self.samples.maxlen or time.monotonic() - self.tared_at < self.retare_interval:
+            return
+        # 任何一筆讀值超出 zero_band 就表示秤上可能有東西，不能歸零
+        if max(abs(value - self.offset) for value in samples) / self.reference_unit >= self.zero_band:
+            return
+        drift = (statistics.median(samples) - self.offset) / self.reference_unit
+        if abs(drift) > self.drift_threshold \
+                and statistics.pstdev(samples) / self.reference_unit < self.stable_stdev:
+            self.offset = statistics.median(samples)
+            self.tared_at = time.monotonic()
+            print(f"Re-tared scale, zero drifted by {round(drift, 2)}")
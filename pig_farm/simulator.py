@@ -0,0 +1,221 @@
+import argparse
+import base64
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import rsa
+
+from blockchain_client import public_key_str, sender_id
+
+# 每間豬舍各感測串流的平均頻率(次/秒)，用來決定負載中各種訊息的比例
+STREAM_RATES = {
+    "env": 1 / 2,      # DHT22 + PM2.5，每 2 秒一筆
+    "weigh": 1 / 60,   # RFID + 秤重，約每分鐘一頭豬過磅
+}
+
+
+class Barn:
+    """模擬一間豬舍的溫濕度、PM2.5 與豬隻過磅"""
+
+    def __init__(self, index, pigs, keys, rng):
+        self.index = index
+        self.rng = rng
+        self.keys = keys
+        self.base_temperature = rng.uniform(24, 30)
+        self.pm25 = rng.uniform(20, 60)
+        # MFRC522 的 read_id() 回傳 40 bit 的卡號
+        self.pigs = {rng.getrandbits(40): rng.uniform(20, 110) for _ in range(pigs)}
+
+    def env_message(self, now):
+        # 日夜溫差加上感測雜訊，濕度與溫度反向變化
+        daily = math.sin(2 * math.pi * (now % 86400) / 86400)
+        temperature = self.base_temperature + 3 * daily + self.rng.gauss(0, 0.2)
+        humidity = min(100.0, max(0.0, 70 - 8 * daily + self.rng.gauss(0, 1.0)))
+        self.pm25 = max(0.0, self.pm25 + self.rng.gauss(0, 2.0))
+        return str({
+            "temperature": f"{temperature:.1f}",
+            "humidity": f"{humidity:.1f}",
+            "PM2.5": f"{self.pm25:.2f}"
+        })
+
+    def weigh_message(self, now):
+        pig = self.rng.choice(list(self.pigs))
+        self.pigs[pig] += self.rng.uniform(0, 0.05)
+        return str({"id": str(pig), "weight": f"{self.pigs[pig] + self.rng.gauss(0, 0.3):.1f}"})
+
+    def message(self, kind, now):
+        return self.env_message(now) if kind == "env" else self.weigh_message(now)
+
+
+class LoadGenerator:
+    """以固定的到達率(open-loop)送出交易，不等待前一筆回應，並記錄送出到被挖出的延遲"""
+
+    def __init__(self, server_url, barns, rate, workers=32, poll_interval=0.2):
+        self.server_url = server_url.rstrip('/')
+        self.barns = barns
+        self.rate = rate
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # (sender, message, timestamp) -> 送出時間
+        self.submitted = {}
+        self.accept_latencies = []
+        self.mined_latencies = []
+        self.rejected = {}
+        self.errors = 0
+        self.late = 0
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def register(self):
+        for barn in self.barns:
+            for public_key, _, _ in barn.keys:
+                while True:
+                    response = requests.post(f"{self.server_url}/register_sender", json={"public_key": public_key})
+                    # 節點限制註冊速率時依 Retry-After 等待後重試
+                    if response.status_code != 429:
+                        break
+                    time.sleep(float(response.headers.get("Retry-After", 1)))
+
+    def submit(self, sender, private_key, message):
+        timestamp = int(time.time())
+        transaction_str = str({"version": 2, "sender": sender, "message": message, "timestamp": timestamp})
+        signature = rsa.sign(transaction_str.encode('utf-8'), private_key, 'SHA-1')
+        data = {
+            "data": {"sender": sender, "message": message, "timestamp": timestamp, "version": 2},
+            "signature": base64.b64encode(signature).decode('utf-8')
+        }
+        start = time.time()
+        key = (sender, message, timestamp)
+        with self.lock:
+            self.submitted[key] = start
+        try:
+            res = self.session().post(f"{self.server_url}/transaction", json=data, timeout=10).json()
+        except (requests.RequestException, ValueError):
+            with self.lock:
+                self.errors += 1
+                del self.submitted[key]
+            return
+        with self.lock:
+            if res["success"]:
+                self.accept_latencies.append(time.time() - start)
+            else:
+                self.rejected[res["message"]] = self.rejected.get(res["message"], 0) + 1
+                del self.submitted[key]
+
+    def run(self, duration, rng):
+        kinds = list(STREAM_RATES)
+        weights = [STREAM_RATES[kind] for kind in kinds]
+        stop = threading.Event()
+        watcher = threading.Thread(target=self.watch_chain, args=(stop,), daemon=True)
+        watcher.start()
+
+        start = time.monotonic()
+        next_arrival = start
+        while next_arrival - start < duration:
+            # Poisson 到達：間隔為指數分佈
+            next_arrival += rng.expovariate(self.rate)
+            delay = next_arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.1:
+                self.late += 1
+            barn = rng.choice(self.barns)
+            _, sender, private_key = rng.choice(barn.keys)
+            message = barn.message(rng.choices(kinds, weights)[0], time.time())
+            self.executor.submit(self.submit, sender, private_key, message)
+
+        self.executor.shutdown(wait=True)
+        # 等最後送出的交易被挖出
+        deadline = time.time() + 30
+        while self.submitted and time.time() < deadline:
+            time.sleep(self.poll_interval)
+        stop.set()
+        watcher.join()
+        return time.monotonic() - start
+
+    def watch_chain(self, stop):
+        """輪詢新區塊，在看到交易被打包時記錄延遲"""
+        session = requests.Session()
+        height = session.get(f"{self.server_url}/get_headers",
+                             params={"start": 0, "count": 0}).json()["height"]
+        while not stop.is_set():
+            try:
+                data = session.get(f"{self.server_url}/get_headers",
+                                   params={"start": height, "count": 500}).json()
+                hashes = [header["hash"] for header in data["headers"]]
+                if hashes:
+                    blocks = session.post(f"{self.server_url}/get_blocks", json={"hashes": hashes}).json()["blocks"]
+                    now = time.time()
+                    with self.lock:
+                        for block in blocks:
+                            for tx in block["transactions"]:
+                                start = self.submitted.pop((tx["sender"], tx["message"], tx["timestamp"]), None)
+                                if start is not None:
+                                    self.mined_latencies.append(now - start)
+                    height += len(blocks)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Error polling chain: {e}")
+            stop.wait(self.poll_interval)
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    values = sorted(values)
+
+    def pick(p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+    return (f"p50 {pick(50) * 1000:.0f} ms, p90 {pick(90) * 1000:.0f} ms, "
+            f"p99 {pick(99) * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate barns and load-test a blockchain node")
+    parser.add_argument("--server", default="http://localhost:8000", help="blockchain node URL")
+    parser.add_argument("--barns", type=int, default=10)
+    parser.add_argument("--pigs", type=int, default=20, help="pigs per barn")
+    parser.add_argument("--keys", type=int, default=1, help="sender key pairs per barn")
+    parser.add_argument("--rate", type=float, default=20.0, help="transactions per second (open-loop)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to generate load")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent HTTP requests")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Generating {args.barns * args.keys} key pairs...")
+    barns = []
+    for i in range(args.barns):
+        keys = []
+        for _ in range(args.keys):
+            public_key, private_key = rsa.newkeys(512)
+            public_key = public_key_str(public_key)
+            # 交易中只帶 sender id
+            keys.append((public_key, sender_id(public_key), private_key))
+        barns.append(Barn(i, args.pigs, keys, rng))
+
+    generator = LoadGenerator(args.server, barns, args.rate, args.workers)
+    generator.register()
+    print(f"Sending {args.rate} tx/s for {args.duration}s to {args.server}")
+    elapsed = generator.run(args.duration, rng)
+
+    accepted = len(generator.accept_latencies)
+    print(f"Elapsed: {elapsed:.1f}s")
+    print(f"Accepted: {accepted} ({accepted / args.duration:.1f} tx/s), mined: {len(generator.mined_latencies)}, "
+          f"not mined: {len(generator.submitted)}, errors: {generator.errors}, late arrivals: {generator.late}")
+    for message, count in generator.rejected.items():
+        print(f"Rejected {count}: {message}")
+    print(f"Submit to accepted: {percentiles(generator.accept_latencies)}")
+    print(f"Submit to mined:    {percentiles(generator.mined_latencies)}")
+
+
+if __name__ == '__main__':
+    main()